@@ -1,71 +1,272 @@
-from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain.prompts import ChatPromptTemplate
-from langchain.memory import ConversationBufferWindowMemory
-from rag_tool import RAGSearchTool
-from search_tool import WikipediaSearchTool
+from metadata_catalog import route_metadata_query
+from tracing import Tracer, trace_span, record_event
 from dotenv import load_dotenv
 import os
+import re
+import queue
+import asyncio
+import threading
+
+# LangChain, FAISS y las herramientas se importan al usarse por primera vez:
+# importar este módulo (y abrir la app) no debe esperar a que carguen
 
 load_dotenv()
 
+MODES = ("agent", "direct")
+MEMORY_MODES = ("window", "summary")
+ERROR_PREFIX = "Lo siento, ocurrió un error"
+
+# Pedidos explícitos de búsqueda externa: son los únicos que necesitan el agente en modo directo
+EXTERNAL_SEARCH_PATTERN = re.compile(
+    r"wikipedia|internet|\bweb\b|en l[ií]nea|google|fuentes? externas?|informaci[oó]n externa",
+    re.IGNORECASE
+)
+
+class SharedResources:
+    """Recursos pesados de solo lectura (LLM, herramientas, vector store) compartidos por todas las sesiones"""
+    
+    def __init__(self):
+        # Cada recurso se construye la primera vez que se pide (o en warm_up), con su propio lock:
+        # mientras se carga el vector store, el LLM y la herramienta de Wikipedia no esperan
+        self._locks = {name: threading.Lock() for name in ("llm", "rag_tool", "wikipedia_tool", "answer_cache")}
+        self._llm = None
+        self._rag_tool = None
+        self._wikipedia_tool = None
+        self._answer_cache = None
+        
+        # Trazas por petición (tiempos por etapa, tokens y aciertos de cache)
+        self.tracer = Tracer(enabled=os.getenv("RAG_TRACING", "1") != "0")
+    
+    def _resource(self, name, factory):
+        """Devuelve el recurso, construyéndolo una sola vez aunque lo pidan varios threads"""
+        value = getattr(self, f"_{name}")
+        if value is None:
+            with self._locks[name]:
+                value = getattr(self, f"_{name}")
+                if value is None:
+                    value = factory()
+                    setattr(self, f"_{name}", value)
+        return value
+    
+    @property
+    def llm(self):
+        def create():
+            from langchain_openai import ChatOpenAI
+            
+            return ChatOpenAI(
+                model="gpt-4o-mini",
+                temperature=0.1,
+                max_tokens=1000,
+                stream_usage=True  # Tokens también en streaming, para las trazas
+            )
+        
+        return self._resource("llm", create)
+    
+    @property
+    def rag_tool(self):
+        def create():
+            from rag_tool import RAGSearchTool
+            
+            # El vector store se carga una sola vez aquí
+            return RAGSearchTool()
+        
+        return self._resource("rag_tool", create)
+    
+    @property
+    def wikipedia_tool(self):
+        def create():
+            from search_tool import WikipediaSearchTool
+            
+            return WikipediaSearchTool()
+        
+        return self._resource("wikipedia_tool", create)
+    
+    @property
+    def tools(self):
+        return [self.rag_tool, self.wikipedia_tool]
+    
+    @property
+    def catalog(self):
+        # Catálogo de metadata para responder consultas de semana/autor sin LLM
+        return self.rag_tool.catalog
+    
+    @property
+    def answer_cache(self):
+        def create():
+            from answer_cache import SemanticAnswerCache
+            from embedding_pipeline import get_embeddings
+            from vector_store_io import vector_store_version
+            
+            # Cache de respuestas compartida; se invalida cuando cambia el vector store
+            rag_tool = self.rag_tool
+            return SemanticAnswerCache(
+                embeddings=get_embeddings(),
+                version_fn=lambda: vector_store_version(rag_tool.persist_dir)
+            )
+        
+        return self._resource("answer_cache", create)
+    
+    @property
+    def rag_tool_loaded(self) -> bool:
+        """Indica si el vector store ya está cargado (pedir rag_tool antes bloquea hasta que termine)"""
+        return self._rag_tool is not None
+    
+    def warm_up(self):
+        """Construye todos los recursos (pensado para correr en segundo plano al abrir la app)"""
+        self.llm
+        self.wikipedia_tool
+        self.rag_tool
+        self.answer_cache
+        return self
+
+_shared_resources = None
+_shared_lock = threading.Lock()
+
+def get_shared_resources():
+    """Devuelve los recursos compartidos del proceso, creándolos la primera vez"""
+    global _shared_resources
+    
+    with _shared_lock:
+        if _shared_resources is None:
+            _shared_resources = SharedResources()
+    
+    return _shared_resources
+
 class AIAssistant:
     """Asistente de IA para el curso de Inteligencia Artificial"""
     
-    def __init__(self):
-        # Inicializar LLM
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.1,
-            max_tokens=1000
-        )
-        
-        # Inicializar herramientas
-        self.tools = [
-            RAGSearchTool(),
-            WikipediaSearchTool()
-        ]
-        
-        # Crear prompt del sistema
-        self.system_prompt = self._create_system_prompt()
-        
-        # Inicializar memoria
-        self.memory = ConversationBufferWindowMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            k=5  # Recordar últimas 5 interacciones
-        )
-        
-        # Crear agente
-        self.agent = create_openai_tools_agent(
-            llm=self.llm,
-            tools=self.tools,
-            prompt=self.system_prompt
-        )
-        
-        # Crear executor
-        self.agent_executor = AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            memory=self.memory,
-            verbose=True,
-            max_iterations=3,
-            early_stopping_method="generate"
-        )
-        
-        print("Asistente de IA inicializado correctamente!")
-        print("Herramientas disponibles:")
-        for tool in self.tools:
-            print(f"  - {tool.name}: {tool.description.split('.')[0]}")
-    
-    def _create_system_prompt(self):
-        """Crea el prompt del sistema"""
+    def __init__(self, resources=None, use_answer_cache=True, mode=None, memory_mode=None,
+                 memory_tokens=None):
+        # LLM y herramientas compartidos; solo la memoria es propia de cada sesión
+        self.resources = resources or get_shared_resources()
+        self.mode = mode or os.getenv("ASSISTANT_MODE", "agent")
+        if self.mode not in MODES:
+            raise ValueError(f"Modo desconocido: {self.mode}. Opciones: {', '.join(MODES)}")
+        
+        self.memory_mode = memory_mode or os.getenv("ASSISTANT_MEMORY", "window")
+        if self.memory_mode not in MEMORY_MODES:
+            raise ValueError(f"Memoria desconocida: {self.memory_mode}. Opciones: {', '.join(MEMORY_MODES)}")
+        
+        self.use_answer_cache = use_answer_cache
+        self.memory_tokens = memory_tokens
+        self.tracer = self.resources.tracer
+        self.last_trace = None  # Traza de la última llamada a chat (None si el tracing está apagado)
+        
+        # Memoria, agente y cadena directa se construyen en el primer mensaje
+        self._memory = None
+        self._agent_executor = None
+        self._direct_chain = None
+        
+        print(f"Asistente de IA inicializado correctamente! (modo {self.mode})")
+    
+    @property
+    def llm(self):
+        return self.resources.llm
+    
+    @property
+    def tools(self):
+        return self.resources.tools
+    
+    @property
+    def rag_tool(self):
+        return self.resources.rag_tool
+    
+    @property
+    def catalog(self):
+        return self.resources.catalog
+    
+    @property
+    def answer_cache(self):
+        return self.resources.answer_cache if self.use_answer_cache else None
+    
+    @property
+    def memory(self):
+        if self._memory is None:
+            if self.memory_mode == "summary":
+                from conversation_memory import DEFAULT_MEMORY_TOKENS, TokenBudgetMemory
+                
+                # Acotada por tokens; los turnos viejos se resumen en segundo plano
+                self._memory = TokenBudgetMemory(
+                    llm=self.llm,
+                    memory_key="chat_history",
+                    return_messages=True,
+                    max_tokens=self.memory_tokens or DEFAULT_MEMORY_TOKENS
+                )
+            else:
+                from langchain.memory import ConversationBufferWindowMemory
+                
+                self._memory = ConversationBufferWindowMemory(
+                    memory_key="chat_history",
+                    return_messages=True,
+                    k=5  # Recordar últimas 5 interacciones
+                )
+        return self._memory
+    
+    @property
+    def agent_executor(self):
+        if self._agent_executor is None:
+            from langchain.agents import AgentExecutor, create_openai_tools_agent
+            
+            # Crear agente
+            agent = create_openai_tools_agent(
+                llm=self.llm,
+                tools=self.tools,
+                prompt=self._create_system_prompt()
+            )
+            
+            # Crear executor
+            self._agent_executor = AgentExecutor(
+                agent=agent,
+                tools=self.tools,
+                memory=self.memory,
+                verbose=True,
+                max_iterations=3,
+                early_stopping_method="generate"
+            )
+            
+            print("Herramientas disponibles:")
+            for tool in self.tools:
+                print(f"  - {tool.name}: {tool.description.split('.')[0]}")
+        return self._agent_executor
+    
+    @property
+    def direct_chain(self):
+        if self._direct_chain is None:
+            from langchain_core.output_parsers import StrOutputParser
+            
+            # Modo directo: recuperar de los apuntes y responder con una sola llamada al LLM
+            self._direct_chain = self._create_system_prompt(direct=True) | self.llm | StrOutputParser()
+        return self._direct_chain
+    
+    def _create_system_prompt(self, direct=False):
+        """Crea el prompt del sistema (en modo directo el contexto de los apuntes ya viene incluido)"""
+        if direct:
+            retrieval_instructions = """
+        1. **PRIORIDAD**: Responde usando los fragmentos de los apuntes incluidos en CONTEXTO DE LOS APUNTES
+        2. **Wikipedia**: No tienes herramientas en este modo; si los apuntes no cubren la pregunta, indícalo"""
+            conversation = """
+        CONTEXTO DE LOS APUNTES:
+        {context}
+
+        {chat_history}
+
+        Usuario: {input}
+        """
+        else:
+            retrieval_instructions = """
+        1. **PRIORIDAD**: Siempre busca PRIMERO en los apuntes del curso usando 'rag_search'
+        2. **Wikipedia**: Solo usa 'wikipedia_search' cuando el usuario EXPLÍCITAMENTE pida buscar información externa, ya sea mencionando que busques en internet o que busques en Wikipedia."""
+            conversation = """
+        {chat_history}
+
+        Usuario: {input}
+        {agent_scratchpad}
+        """
+        
         template = """
         Eres un asistente especializado en el curso de Inteligencia Artificial del TEC. Tu objetivo es ayudar a los estudiantes con sus consultas sobre el curso.
 
-        INSTRUCCIONES IMPORTANTES:
-        1. **PRIORIDAD**: Siempre busca PRIMERO en los apuntes del curso usando 'rag_search'
-        2. **Wikipedia**: Solo usa 'wikipedia_search' cuando el usuario EXPLÍCITAMENTE pida buscar información externa, ya sea mencionando que busques en internet o que busques en Wikipedia.
+        INSTRUCCIONES IMPORTANTES:""" + retrieval_instructions + """
         3. **Respuestas**: Sé preciso, educativo y cita las fuentes (semana, autor, archivo)
         4. **Contexto**: Recuerda el contexto de conversaciones anteriores
 
@@ -122,22 +323,241 @@ class AIAssistant:
         - Operadores: \\( \\max \\), \\( \\min \\), \\( \\sum \\)
 
         Responde de manera clara y educativa. Si no encuentras información en los apuntes, menciona que puedes buscar en Wikipedia si el usuario lo desea.
-
-        {chat_history}
-
-        Usuario: {input}
-        {agent_scratchpad}
-        """
+        """ + conversation
+        
+        from langchain_core.prompts import ChatPromptTemplate
         
         return ChatPromptTemplate.from_template(template)
     
+    def _can_use_answer_cache(self, message: str) -> bool:
+        """Las preguntas que dependen del historial no se reutilizan entre conversaciones"""
+        if self.answer_cache is None:
+            return False
+        
+        from answer_cache import depends_on_history
+        
+        return not (self.memory.chat_memory.messages and depends_on_history(message))
+    
+    def _lookup_cached_answer(self, message: str):
+        """Busca una respuesta cacheada; devuelve (respuesta o None, vector o None)"""
+        if not self._can_use_answer_cache(message):
+            return None, None
+        
+        try:
+            with trace_span("answer_cache.lookup"):
+                answer, vector = self.answer_cache.lookup(message)
+            record_event("answer_cache", hit=answer is not None)
+            return answer, vector
+        except Exception as e:
+            print(f"Answer cache lookup failed: {e}")
+            return None, None
+    
+    async def _alookup_cached_answer(self, message: str):
+        """Versión asíncrona de _lookup_cached_answer (el embedding no bloquea el event loop)"""
+        if not self._can_use_answer_cache(message):
+            return None, None
+        
+        try:
+            with trace_span("answer_cache.lookup"):
+                answer, vector = await self.answer_cache.alookup(message)
+            record_event("answer_cache", hit=answer is not None)
+            return answer, vector
+        except Exception as e:
+            print(f"Answer cache lookup failed: {e}")
+            return None, None
+    
+    def _catalog_answer(self, message: str):
+        """Consultas de metadata (autor, semana, fecha): respuesta directa del catálogo, o None"""
+        with trace_span("catalog.route"):
+            catalog_answer = route_metadata_query(message, self.catalog)
+        if catalog_answer is not None:
+            record_event("catalog", hit=True)
+        return catalog_answer
+    
+    def _fast_answer(self, message: str):
+        """Respuesta sin pasar por el agente (catálogo o cache); devuelve (respuesta o None, vector o None)"""
+        catalog_answer = self._catalog_answer(message)
+        if catalog_answer is not None:
+            return catalog_answer, None
+        
+        return self._lookup_cached_answer(message)
+    
+    async def _afast_answer(self, message: str):
+        """Versión asíncrona de _fast_answer"""
+        catalog_answer = self._catalog_answer(message)
+        if catalog_answer is not None:
+            return catalog_answer, None
+        
+        return await self._alookup_cached_answer(message)
+    
+    def _use_agent(self, message: str) -> bool:
+        """El agente con herramientas solo corre en modo agent o si se pide búsqueda externa"""
+        return self.mode == "agent" or EXTERNAL_SEARCH_PATTERN.search(message) is not None
+    
+    def _direct_inputs(self, message: str, context: str):
+        return {
+            "input": message,
+            "context": context,
+            "chat_history": self.memory.load_memory_variables({})["chat_history"]
+        }
+    
+    def _direct_answer(self, message: str, trace) -> str:
+        """Recupera de los apuntes y responde con una sola llamada al LLM"""
+        config = {"callbacks": self.tracer.callbacks(trace)}
+        context = self.rag_tool.invoke({"query": message}, config=config)
+        output = self.direct_chain.invoke(self._direct_inputs(message, context), config=config)
+        self.memory.save_context({"input": message}, {"output": output})
+        return output
+    
+    async def _adirect_answer(self, message: str, trace) -> str:
+        config = {"callbacks": self.tracer.callbacks(trace)}
+        context = await self.rag_tool.ainvoke({"query": message}, config=config)
+        output = await self.direct_chain.ainvoke(self._direct_inputs(message, context), config=config)
+        self.memory.save_context({"input": message}, {"output": output})
+        return output
+    
     def chat(self, message: str) -> str:
         """Procesa un mensaje del usuario"""
+        with self.tracer.request("chat", question=message) as trace:
+            self.last_trace = trace
+            return self._chat(message, trace)
+    
+    def _chat(self, message: str, trace) -> str:
+        fast_answer, vector = self._fast_answer(message)
+        
+        if fast_answer is not None:
+            # Mantener la memoria coherente aunque no se llame al agente
+            self.memory.save_context({"input": message}, {"output": fast_answer})
+            return fast_answer
+        
         try:
-            response = self.agent_executor.invoke({"input": message})
-            return response["output"]
+            if self._use_agent(message):
+                output = self.agent_executor.invoke(
+                    {"input": message},
+                    config={"callbacks": self.tracer.callbacks(trace)}
+                )["output"]
+            else:
+                output = self._direct_answer(message, trace)
         except Exception as e:
-            return f"Lo siento, ocurrió un error: {str(e)}"
+            return f"{ERROR_PREFIX}: {str(e)}"
+        
+        if vector is not None:
+            self.answer_cache.store(vector, output, message)
+        
+        return output
+    
+    async def achat(self, message: str) -> str:
+        """Versión asíncrona de chat; las llamadas a herramientas de un mismo turno corren en paralelo"""
+        with self.tracer.request("achat", question=message) as trace:
+            return await self._achat(message, trace)
+    
+    async def _achat(self, message: str, trace) -> str:
+        fast_answer, vector = await self._afast_answer(message)
+        
+        if fast_answer is not None:
+            self.memory.save_context({"input": message}, {"output": fast_answer})
+            return fast_answer
+        
+        try:
+            if self._use_agent(message):
+                # AgentExecutor.ainvoke ejecuta con asyncio.gather todas las herramientas pedidas en un turno
+                output = (await self.agent_executor.ainvoke(
+                    {"input": message},
+                    config={"callbacks": self.tracer.callbacks(trace)}
+                ))["output"]
+            else:
+                output = await self._adirect_answer(message, trace)
+        except Exception as e:
+            return f"{ERROR_PREFIX}: {str(e)}"
+        
+        if vector is not None:
+            self.answer_cache.store(vector, output, message)
+        
+        return output
+    
+    async def astream_chat(self, message: str):
+        """Procesa un mensaje y emite eventos a medida que ocurren (herramientas y tokens de la respuesta)"""
+        with self.tracer.request("stream_chat", question=message) as trace:
+            async for event in self._astream_chat(message, trace):
+                yield event
+    
+    async def _astream_chat(self, message: str, trace):
+        fast_answer, vector = await self._afast_answer(message)
+        
+        if fast_answer is not None:
+            self.memory.save_context({"input": message}, {"output": fast_answer})
+            yield {"type": "final", "output": fast_answer}
+            return
+        
+        tokens = []
+        output = None
+        use_agent = self._use_agent(message)
+        config = {"callbacks": self.tracer.callbacks(trace)}
+        
+        try:
+            if use_agent:
+                events = self.agent_executor.astream_events({"input": message}, config=config, version="v2")
+            else:
+                # La recuperación no pasa por el agente, pero la interfaz la muestra igual que una herramienta
+                yield {"type": "tool_start", "name": self.rag_tool.name, "input": {"query": message}}
+                context = await self.rag_tool.ainvoke({"query": message}, config=config)
+                yield {"type": "tool_end", "name": self.rag_tool.name}
+                events = self.direct_chain.astream_events(
+                    self._direct_inputs(message, context), config=config, version="v2"
+                )
+            
+            async for event in events:
+                kind = event["event"]
+                
+                if kind == "on_tool_start":
+                    yield {"type": "tool_start", "name": event["name"], "input": event["data"].get("input")}
+                elif kind == "on_tool_end":
+                    yield {"type": "tool_end", "name": event["name"]}
+                elif kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        if not tokens and trace is not None:
+                            trace.mark("first_token")
+                        tokens.append(content)
+                        yield {"type": "token", "text": content}
+                elif kind == "on_chain_end" and event["name"] == "AgentExecutor":
+                    output = (event["data"].get("output") or {}).get("output")
+        except Exception as e:
+            yield {"type": "error", "message": f"{ERROR_PREFIX}: {str(e)}"}
+            return
+        
+        output = output if output is not None else "".join(tokens)
+        
+        if not use_agent:
+            self.memory.save_context({"input": message}, {"output": output})
+        
+        if vector is not None:
+            self.answer_cache.store(vector, output, message)
+        
+        yield {"type": "final", "output": output}
+    
+    def stream_chat(self, message: str):
+        """Versión síncrona de astream_chat: generador de eventos para la interfaz"""
+        events = queue.Queue()
+        done = object()
+        
+        async def consume():
+            async for event in self.astream_chat(message):
+                events.put(event)
+        
+        def run():
+            try:
+                asyncio.run(consume())
+            except Exception as e:
+                # Errores fuera del try de astream_chat (p. ej. al crear el LLM o la cache sin API key)
+                events.put({"type": "error", "message": f"{ERROR_PREFIX}: {str(e)}"})
+            finally:
+                events.put(done)
+        
+        threading.Thread(target=run, daemon=True).start()
+        
+        while (event := events.get()) is not done:
+            yield event
     
     def reset_memory(self):
         """Reinicia la memoria de conversación"""
@@ -0,0 +1,128 @@
+import re
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# Referencias a turnos anteriores: la respuesta depende del historial y no se puede reutilizar
+HISTORY_PATTERN = re.compile(
+    r"^\s*¿?\s*y\s|"
+    r"\b(eso|esto|esa|ese|aquello|lo anterior|anteriormente|mencionad[oa]s?|"
+    r"dijiste|explicaste|tu respuesta|otra vez|de nuevo|más detalle|profundiza|"
+    r"continúa|sigue|explícalo|resúmelo|amplíalo|otro ejemplo)\b",
+    re.IGNORECASE
+)
+
+# Números de la pregunta (semana, proyecto, tarea...): preguntas que solo difieren en ellos son muy
+# similares por coseno pero tienen respuestas distintas
+NUMBER_PATTERN = re.compile(r"\d+")
+
+def depends_on_history(question):
+    """Heurística: indica si la pregunta hace referencia a la conversación previa"""
+    return bool(HISTORY_PATTERN.search(question))
+
+def numeric_tokens(question):
+    """Números que aparecen en la pregunta, en orden"""
+    return tuple(NUMBER_PATTERN.findall(question or ""))
+
+def _normalize(vector):
+    """Vector float32 de norma 1"""
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+class SemanticAnswerCache:
+    """Cache de respuestas por similitud coseno entre embeddings de preguntas, con TTL y expulsión LRU"""
+    
+    def __init__(self, embeddings, threshold=0.92, ttl=3600, max_entries=256, version_fn=None):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_fn = version_fn
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._counter = 0
+        self._lock = threading.Lock()
+    
+    def _check_version(self):
+        """Vacía la cache si el vector store cambió desde la última consulta"""
+        if not self.version_fn:
+            return
+        
+        version = self.version_fn()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+    
+    def embed(self, question):
+        """Embebe y normaliza la pregunta para comparar por coseno"""
+        return _normalize(self.embeddings.embed_query(question))
+    
+    async def aembed(self, question):
+        """Versión asíncrona de embed: la petición a la API no bloquea el event loop"""
+        return _normalize(await self.embeddings.aembed_query(question))
+    
+    def lookup(self, question):
+        """Busca una respuesta para una pregunta similar; devuelve (respuesta o None, vector)"""
+        return self._match(question, self.embed(question))
+    
+    async def alookup(self, question):
+        """Versión asíncrona de lookup"""
+        return self._match(question, await self.aembed(question))
+    
+    def _match(self, question, vector):
+        """Compara el vector con las entradas vigentes; devuelve (respuesta o None, vector)"""
+        numbers = numeric_tokens(question)
+        now = time.time()
+        
+        with self._lock:
+            self._check_version()
+            
+            # Eliminar entradas vencidas
+            for key in [key for key, entry in self._entries.items() if now - entry[2] > self.ttl]:
+                del self._entries[key]
+            
+            # Solo se reutilizan respuestas de preguntas con exactamente los mismos números
+            keys = [key for key, entry in self._entries.items() if entry[3] == numbers]
+            if not keys:
+                self.misses += 1
+                return None, vector
+            
+            matrix = np.vstack([self._entries[key][0] for key in keys])
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None, vector
+            
+            self._entries.move_to_end(keys[best])
+            self.hits += 1
+            return self._entries[keys[best]][1], vector
+    
+    def store(self, vector, answer, question=""):
+        """Guarda la respuesta asociada al vector (y a los números) de la pregunta"""
+        with self._lock:
+            self._check_version()
+            self._counter += 1
+            self._entries[self._counter] = (vector, answer, time.time(), numeric_tokens(question))
+            
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Vacía la cache"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Estadísticas de uso de la cache"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._entries)
+        }
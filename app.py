@@ -1,11 +1,16 @@
 import streamlit as st
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from agent import AIAssistant
+from agent import AIAssistant, get_shared_resources
+from tracing import RERUN_TRACE, Tracer, load_traces, summarize_traces
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Cada ejecución del script (rerun de Streamlit) se registra como una traza propia
+rerun_tracer = Tracer(enabled=os.getenv("RAG_TRACING", "1") != "0")
+
 def init_session_state():
     """Inicializa todas las variables de estado de sesión"""
     if "messages" not in st.session_state:
@@ -26,12 +31,24 @@ def init_session_state():
     if "processing" not in st.session_state:
         st.session_state.processing = False
 
+@st.cache_resource(show_spinner=False)
+def load_shared_resources():
+    """Recursos compartidos del proceso; el vector store, los clientes y las herramientas se cargan al usarse"""
+    return get_shared_resources()
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    """Precarga en segundo plano el vector store y las herramientas, sin bloquear la página"""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-up")
+    return executor.submit(load_shared_resources().warm_up)
+
 def initialize_assistant():
     """Inicializa el asistente de IA"""
     if not st.session_state.assistant_initialized:
         try:
             with st.spinner("🤖 Inicializando asistente de IA..."):
-                st.session_state.assistant = AIAssistant()
+                # Cada sesión solo crea su propia memoria de conversación
+                st.session_state.assistant = AIAssistant(resources=load_shared_resources())
                 st.session_state.assistant_initialized = True
         except Exception as e:
             st.error(f"Error al inicializar el asistente: {str(e)}")
@@ -48,22 +65,69 @@ def display_chat_history():
             else:
                 st.markdown(content)
 
-def process_user_input(user_input):
-    """Procesa la entrada del usuario"""
+TOOL_LABELS = {
+    "rag_search": "🔍 Buscando en los apuntes del curso...",
+    "wikipedia_search": "🌐 Buscando en Wikipedia...",
+}
+
+def render_markdown(placeholder, content):
+    """Muestra contenido en el placeholder, habilitando HTML si trae LaTeX"""
+    if "\\(" in content or "$$" in content:
+        placeholder.markdown(content, unsafe_allow_html=True)
+    else:
+        placeholder.markdown(content)
+
+def stream_user_input(user_input, placeholder):
+    """Procesa la entrada del usuario mostrando la respuesta a medida que llega"""
     if not st.session_state.assistant:
         st.error("El asistente no está inicializado")
         return None
     
+    # Si la precarga no terminó, el primer mensaje espera al vector store: se avisa en lugar de quedar en blanco
+    if st.session_state.assistant.resources.rag_tool_loaded:
+        placeholder.markdown("🤔 Pensando...")
+    else:
+        placeholder.markdown("⏳ Cargando los apuntes del curso, un momento...")
+    text = ""
+    response = None
+    
     try:
-        response = st.session_state.assistant.chat(user_input)
-        
-        # Asegurar que la respuesta tenga fuentes si no las tiene
-        if "**Fuentes:**" not in response and "Fuentes:" not in response:
-            response += "\n\n**Fuentes:**\n- Basado en conocimiento general del curso"
-        
-        return response
+        for event in st.session_state.assistant.stream_chat(user_input):
+            if event["type"] == "tool_start":
+                placeholder.markdown(TOOL_LABELS.get(event["name"], f"🛠️ Usando {event['name']}..."))
+            elif event["type"] == "token":
+                text += event["text"]
+                render_markdown(placeholder, text + "▌")
+            elif event["type"] == "final":
+                response = event["output"]
+            elif event["type"] == "error":
+                return f"**Error:** {event['message']}\n\n**Fuentes:**\n- Error en el procesamiento"
     except Exception as e:
         return f"**Error:** {str(e)}\n\n**Fuentes:**\n- Error en el procesamiento"
+    
+    response = response if response is not None else text
+    
+    # Asegurar que la respuesta tenga fuentes si no las tiene
+    if "**Fuentes:**" not in response and "Fuentes:" not in response:
+        response += "\n\n**Fuentes:**\n- Basado en conocimiento general del curso"
+    
+    return response
+
+def render_performance_panel():
+    """Percentiles por etapa de las últimas peticiones trazadas"""
+    summary = summarize_traces(load_traces())
+    
+    if not summary['requests']:
+        st.caption("Aún no hay trazas registradas")
+        return
+    
+    st.metric("Peticiones trazadas", summary['requests'], help=f"Además, {summary['reruns']} reejecuciones de la interfaz")
+    st.dataframe(summary['spans'], hide_index=True, use_container_width=True)
+    st.caption(
+        f"Tokens: {summary['prompt_tokens']} de prompt, {summary['completion_tokens']} de respuesta"
+    )
+    if summary['events']:
+        st.json(summary['events'], expanded=False)
 
 def main():
     # Configuración de la página
@@ -135,6 +199,9 @@ def main():
     st.markdown("*Especializado en Inteligencia Artificial*")
     st.markdown("---")
     
+    # La página se dibuja de inmediato; los apuntes se cargan mientras tanto
+    warm_up = start_warm_up()
+    
     # Sidebar con información
     with st.sidebar:
         st.header("📚 Información del Asistente")
@@ -146,6 +213,14 @@ def main():
         else:
             st.success("API Key configurada")
         
+        # Estado de la precarga del vector store
+        if not warm_up.done():
+            st.info("⏳ Cargando apuntes en segundo plano...")
+        elif warm_up.exception():
+            st.warning(f"No se pudieron precargar los apuntes: {warm_up.exception()}")
+        else:
+            st.success("Apuntes cargados")
+        
         st.markdown("""
         **Capacidades:**
         - 🔍 Búsqueda en apuntes del curso
@@ -177,6 +252,10 @@ def main():
             user_messages = len([m for m in st.session_state.messages if m["role"] == "user"])
             st.metric("Mensajes enviados", user_messages)
         
+        # Tiempos por etapa (embeddings, búsqueda, LLM, herramientas, reruns)
+        with st.expander("⏱️ Rendimiento"):
+            render_performance_panel()
+        
         st.markdown("---")
         
         # Ejemplos de preguntas
@@ -254,8 +333,8 @@ def main():
             # Crear placeholder vacío para evitar "fantasmas"
             message_placeholder = st.empty()
             
-            with st.spinner("🤔 Pensando y buscando información..."):
-                response = process_user_input(user_input)
+            # Los eventos y tokens se muestran en el placeholder a medida que llegan
+            response = stream_user_input(user_input, message_placeholder)
             
             if response:
                 # Mostrar la respuesta final
@@ -295,8 +374,8 @@ def main():
             # Crear placeholder vacío para evitar "fantasmas"
             message_placeholder = st.empty()
             
-            with st.spinner("🤔 Pensando y buscando información..."):
-                response = process_user_input(user_input)
+            # Los eventos y tokens se muestran en el placeholder a medida que llegan
+            response = stream_user_input(user_input, message_placeholder)
             
             if response:
                 # Mostrar la respuesta final
@@ -315,4 +394,5 @@ def main():
         st.rerun()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with rerun_tracer.request(RERUN_TRACE):
+        main()
\ No newline at end of file
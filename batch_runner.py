@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from agent import ERROR_PREFIX, MODES, AIAssistant, get_shared_resources
+
+load_dotenv()
+
+SOURCES_HEADER = "**Fuentes:**"
+
+class RateLimiter:
+    """Limita las peticiones por segundo compartidas entre todos los workers"""
+    
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        if not self.interval:
+            return
+        
+        with self._lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        
+        if wait > 0:
+            time.sleep(wait)
+
+def extract_sources(answer):
+    """Líneas del bloque **Fuentes:** de una respuesta"""
+    if SOURCES_HEADER not in answer:
+        return []
+    
+    block = answer.rsplit(SOURCES_HEADER, 1)[1]
+    return [line.strip()[2:].strip() for line in block.splitlines() if line.strip().startswith("- ")]
+
+def trace_timings(trace):
+    """Tiempos por etapa de una traza de AIAssistant"""
+    if trace is None:
+        return {}
+    
+    spans = trace.spans
+    return {
+        'total_ms': trace.duration_ms,
+        'llm_calls': sum(1 for span in spans if span['name'] == 'llm'),
+        'llm_ms': round(sum(span['duration_ms'] for span in spans if span['name'] == 'llm'), 3),
+        'retrieval_ms': round(sum(span['duration_ms'] for span in spans if span['name'].startswith('tool.')), 3),
+        'prompt_tokens': trace.tokens['prompt'],
+        'completion_tokens': trace.tokens['completion'],
+    }
+
+def read_questions(input_path, question_field="question", id_field="id"):
+    """Generador de (id, pregunta) del archivo JSONL de entrada; sin id se usa el número de línea"""
+    with open(input_path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question = record.get(question_field)
+            if not question:
+                print(f"Line {line_number}: missing '{question_field}', skipped")
+                continue
+            yield str(record.get(id_field, line_number)), question
+
+def completed_ids(output_path):
+    """Ids ya respondidos sin error en el archivo de salida (para retomar)"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Línea truncada por una interrupción
+            if 'error' not in record:
+                done.add(record['id'])
+    
+    return done
+
+def compact_output(output_path):
+    """Reescribe la salida con un solo registro por id y sin líneas truncadas; devuelve las líneas quitadas"""
+    if not os.path.exists(output_path):
+        return 0
+    
+    records = {}
+    n_lines = 0
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            n_lines += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Línea truncada por una interrupción
+            # Gana el registro más reciente, salvo que sea un error y ya haya una respuesta buena
+            previous = records.get(record['id'])
+            if previous is None or 'error' in previous or 'error' not in record:
+                records[record['id']] = record
+    
+    # Archivo temporal y rename: una interrupción aquí no deja la salida a medio escribir
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for record in records.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, output_path)
+    
+    return n_lines - len(records)
+
+class BatchRunner:
+    """Responde un banco de preguntas con varios workers, cada uno con su propio AIAssistant"""
+    
+    def __init__(self, output_path, workers=4, rate=1.0, mode=None):
+        self.output_path = output_path
+        self.workers = workers
+        self.mode = mode
+        self.limiter = RateLimiter(rate)
+        self.resources = get_shared_resources()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+    
+    def _assistant(self):
+        """Asistente del worker actual; comparte LLM, herramientas y caches con los demás"""
+        if not hasattr(self._local, 'assistant'):
+            self._local.assistant = AIAssistant(resources=self.resources, mode=self.mode)
+            self._local.assistant.agent_executor.verbose = False
+        return self._local.assistant
+    
+    def _answer(self, question_id, question):
+        assistant = self._assistant()
+        # Cada pregunta es independiente: sin historial de la anterior
+        assistant.memory.clear()
+        
+        self.limiter.acquire()
+        start = time.perf_counter()
+        answer = assistant.chat(question)
+        elapsed = time.perf_counter() - start
+        
+        record = {
+            'id': question_id,
+            'question': question,
+            'answer': answer,
+            'sources': extract_sources(answer),
+            'mode': assistant.mode,
+            'timings': {'wall_ms': round(elapsed * 1000, 3), **trace_timings(assistant.last_trace)},
+        }
+        if answer.startswith(ERROR_PREFIX):
+            record['error'] = answer
+        
+        self._write(record)
+        return record
+    
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._write_lock, open(self.output_path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+    
+    def run(self, questions, resume=True):
+        """Procesa las preguntas en streaming, con a lo sumo 2·workers pendientes"""
+        # Una interrupción puede dejar una línea cortada (y reintentos dejan ids repetidos)
+        removed = compact_output(self.output_path)
+        if removed:
+            print(f"Removed {removed} duplicate or truncated lines from {self.output_path}")
+        
+        done = completed_ids(self.output_path) if resume else set()
+        if done:
+            print(f"Resuming: {len(done)} questions already answered")
+        
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        answered = failed = skipped = 0
+        start = time.perf_counter()
+        
+        def collect(future):
+            nonlocal answered, failed
+            try:
+                record = future.result()
+            except Exception as e:
+                print(f"Question failed: {e}")
+                failed += 1
+                return
+            if 'error' in record:
+                failed += 1
+            else:
+                answered += 1
+            print(f"[{answered + failed}] {record['id']}: {record['timings']['wall_ms'] / 1000:.2f}s")
+        
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as executor:
+            pending = deque()
+            
+            for question_id, question in questions:
+                if question_id in done:
+                    skipped += 1
+                    continue
+                
+                pending.append(executor.submit(self._answer, question_id, question))
+                if len(pending) >= self.workers * 2:
+                    collect(pending.popleft())
+            
+            while pending:
+                collect(pending.popleft())
+        
+        # Reintentos de preguntas fallidas (o --no-resume) agregan otro registro con el mismo id
+        compact_output(self.output_path)
+        
+        elapsed = time.perf_counter() - start
+        print(f"\nAnswered {answered}, failed {failed}, skipped {skipped} in {elapsed:.1f}s")
+        return {'answered': answered, 'failed': failed, 'skipped': skipped, 'seconds': round(elapsed, 3)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Responde un banco de preguntas (JSONL) con el asistente")
+    parser.add_argument("input", help="Archivo JSONL con una pregunta por línea")
+    parser.add_argument("output", help="Archivo JSONL de respuestas (se agrega al final, un registro por id)")
+    parser.add_argument("--workers", type=int, default=4, help="Preguntas procesadas en paralelo")
+    parser.add_argument("--rate", type=float, default=1.0, help="Preguntas por segundo como máximo (0 = sin límite)")
+    parser.add_argument("--mode", choices=MODES, help="Modo del asistente (por defecto ASSISTANT_MODE)")
+    parser.add_argument("--question-field", default="question", help="Campo con el texto de la pregunta")
+    parser.add_argument("--id-field", default="id", help="Campo con el id de la pregunta")
+    parser.add_argument("--no-resume", action="store_true", help="Responde todo aunque ya esté en la salida")
+    args = parser.parse_args()
+    
+    runner = BatchRunner(args.output, workers=args.workers, rate=args.rate, mode=args.mode)
+    runner.run(read_questions(args.input, args.question_field, args.id_field), resume=not args.no_resume)
@@ -0,0 +1,796 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from fake_embedding_server import fake_embedding
+from index_factory import PRECISIONS, create_index, set_search_params, reconstruct_vectors
+from vector_store_io import load_vector_store
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PERSIST_DIR = os.path.join(DIRECTORY, "vector_store")
+DEFAULT_PDF_DIR = os.path.join(DIRECTORY, "Apuntadores")
+RESULTS_DIR = os.path.join(DIRECTORY, "bench_results")
+
+BENCHMARK_QUERIES = [
+    "Kenneth Chacón",
+    "backpropagation",
+    "proyecto II",
+    "regresión logística",
+    "¿Qué es la función sigmoide?",
+    "descenso de gradiente estocástico",
+    "redes neuronales convolucionales",
+    "¿Cómo se calcula la función de pérdida de entropía cruzada?",
+]
+
+# Respuesta típica del asistente: explicación con LaTeX y bloque de fuentes
+SAMPLE_ANSWER = """La función sigmoide es \\( \\sigma(x) = \\frac{1}{1 + e^{-x}} \\) y su derivada es
+\\( \\sigma'(x) = \\sigma(x)(1 - \\sigma(x)) \\). En backpropagation el gradiente de la pérdida respecto
+a los pesos se obtiene con la regla de la cadena: $$ \\frac{\\partial L}{\\partial w} =
+\\frac{\\partial L}{\\partial \\hat{y}} \\cdot \\frac{\\partial \\hat{y}}{\\partial z} \\cdot
+\\frac{\\partial z}{\\partial w} $$ y los pesos se actualizan con \\( w \\leftarrow w - \\eta \\nabla L \\).
+""" * 4 + """
+**Fuentes:**
+- Semana 4, Autor: Marco Rivera Serrano, Archivo: 4_SEMANA_AI_250311_1.pdf
+- Semana 3, Autor: Jeremy Chacón Backford, Archivo: 3_SEMANA_AI_250304_1.pdf
+"""
+
+class DeterministicEmbeddings(Embeddings):
+    """Embeddings locales y deterministas (hash del texto) para medir sin la API de OpenAI"""
+    
+    def __init__(self, dim=1536):
+        self.dim = dim
+    
+    def embed_documents(self, texts):
+        return [fake_embedding(text, self.dim).tolist() for text in texts]
+    
+    def embed_query(self, text):
+        return fake_embedding(text, self.dim).tolist()
+
+def percentile(values, q):
+    """Percentil q (0-100) de una lista de valores"""
+    return float(np.percentile(values, q)) if len(values) else 0.0
+
+def load_corpus_vectors(persist_dir, scale=1, seed=0):
+    """Lee los vectores del índice guardado; con scale > 1 agrega copias perturbadas"""
+    index = faiss.read_index(os.path.join(persist_dir, "index.faiss"))
+    vectors = reconstruct_vectors(index)
+    
+    if scale > 1:
+        rng = np.random.default_rng(seed)
+        copies = [vectors]
+        for _ in range(scale - 1):
+            noisy = vectors + rng.normal(0, 0.02, vectors.shape).astype(np.float32)
+            copies.append(noisy / np.linalg.norm(noisy, axis=1, keepdims=True))
+        vectors = np.vstack(copies)
+    
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+def sample_queries(vectors, n_queries, seed=0):
+    """Consultas sintéticas: vectores del corpus con ruido, normalizados"""
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    noisy = picks + rng.normal(0, 0.05, picks.shape).astype(np.float32)
+    return np.ascontiguousarray(noisy / np.linalg.norm(noisy, axis=1, keepdims=True), dtype=np.float32)
+
+def measure_queries(index, queries, k):
+    """Busca consulta por consulta (como lo hace la herramienta) y mide la latencia"""
+    latencies = []
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, found = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids[i] = found[0]
+    
+    return ids, latencies
+
+def recall_at_k(found, truth):
+    """Fracción de los k vecinos exactos recuperados por el índice aproximado"""
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def index_report(persist_dir, k=5, n_queries=200, scale=1):
+    """Compara recall@k y latencia de cada tipo de índice contra la búsqueda plana exacta"""
+    vectors = load_corpus_vectors(persist_dir, scale)
+    queries = sample_queries(vectors, n_queries)
+    dim = vectors.shape[1]
+    print(f"Corpus: {len(vectors)} vectors of dim {dim}, {len(queries)} queries, k={k}")
+    
+    configs = [("flat", {})]
+    configs += [("ivf", {"nprobe": n}) for n in (1, 4, 16, 64)]
+    configs += [("hnsw", {"ef_search": ef}) for ef in (16, 64, 256)]
+    configs += [("ivfpq", {"nprobe": n}) for n in (4, 16, 64)]
+    
+    built = {}
+    truth = None
+    rows = []
+    
+    for index_type, params in configs:
+        if index_type not in built:
+            start = time.perf_counter()
+            index = create_index(index_type, dim, training_vectors=vectors)
+            index.add(vectors)
+            built[index_type] = (index, time.perf_counter() - start)
+        
+        index, build_time = built[index_type]
+        set_search_params(index, **params)
+        found, latencies = measure_queries(index, queries, k)
+        
+        if truth is None:
+            truth = found
+        
+        rows.append({
+            'index_type': index_type,
+            'params': params,
+            'build_s': round(build_time, 3),
+            f'recall@{k}': round(recall_at_k(found, truth), 4),
+            'latency_ms_mean': round(float(np.mean(latencies)), 4),
+            'latency_ms_p95': round(percentile(latencies, 95), 4),
+        })
+    
+    print(f"\n{'index':<8}{'params':<18}{'build(s)':>10}{'recall@' + str(k):>11}{'mean(ms)':>10}{'p95(ms)':>10}")
+    print("-" * 67)
+    for row in rows:
+        params = ",".join(f"{key}={value}" for key, value in row['params'].items()) or "-"
+        print(f"{row['index_type']:<8}{params:<18}{row['build_s']:>10.3f}{row[f'recall@{k}']:>11.4f}"
+              f"{row['latency_ms_mean']:>10.4f}{row['latency_ms_p95']:>10.4f}")
+    
+    return rows
+
+def precision_report(persist_dir, k=5, n_queries=200, scale=1, index_type="flat"):
+    """Tamaño, carga, latencia y recall@k de cada precisión de almacenamiento contra float32 exacto"""
+    vectors = load_corpus_vectors(persist_dir, scale)
+    queries = sample_queries(vectors, n_queries)
+    dim = vectors.shape[1]
+    print(f"Corpus: {len(vectors)} vectors of dim {dim}, {len(queries)} queries, k={k}, index={index_type}")
+    
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    truth, _ = measure_queries(exact, queries, k)
+    
+    work_dir = tempfile.mkdtemp(prefix="rag-precision-")
+    rows = []
+    
+    try:
+        for precision in PRECISIONS:
+            index = create_index(index_type, dim, training_vectors=vectors, precision=precision)
+            index.add(vectors)
+            path = os.path.join(work_dir, f"{precision}.faiss")
+            faiss.write_index(index, path)
+            del index
+            
+            start = time.perf_counter()
+            index = faiss.read_index(path)
+            load_time = time.perf_counter() - start
+            
+            found, latencies = measure_queries(index, queries, k)
+            rows.append({
+                'precision': precision,
+                'size_mb': round(os.path.getsize(path) / (1024 * 1024), 3),
+                'load_ms': round(load_time * 1000, 3),
+                'latency_ms_mean': round(float(np.mean(latencies)), 4),
+                'latency_ms_p95': round(percentile(latencies, 95), 4),
+                f'recall@{k}': round(recall_at_k(found, truth), 4),
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    print(f"\n{'precision':<10}{'size(MB)':>10}{'load(ms)':>10}{'mean(ms)':>10}{'p95(ms)':>10}{'recall@' + str(k):>11}")
+    print("-" * 61)
+    for row in rows:
+        print(f"{row['precision']:<10}{row['size_mb']:>10.3f}{row['load_ms']:>10.3f}{row['latency_ms_mean']:>10.4f}"
+              f"{row['latency_ms_p95']:>10.4f}{row[f'recall@{k}']:>11.4f}")
+    
+    return rows
+
+def two_stage_report(persist_dir, k=5, n_queries=200, scale=1, dims=(128, 256, 512), candidates=(20, 50, 100)):
+    """Recall@k, latencia y bytes recorridos de la búsqueda en dos etapas contra la búsqueda plana completa"""
+    from compact_index import FULL_VECTORS_FILE, COMPACT_INDEX_FILE, TwoStageSearcher, truncate_vectors
+    
+    vectors = load_corpus_vectors(persist_dir, scale)
+    queries = sample_queries(vectors, n_queries)
+    dim = vectors.shape[1]
+    print(f"Corpus: {len(vectors)} vectors of dim {dim}, {len(queries)} queries, k={k}")
+    
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    truth, latencies = measure_queries(exact, queries, k)
+    rows = [{
+        'config': f"full d={dim}",
+        f'recall@{k}': 1.0,
+        'latency_ms_mean': round(float(np.mean(latencies)), 4),
+        'latency_ms_p95': round(percentile(latencies, 95), 4),
+        'scan_mb': round(vectors.nbytes / (1024 * 1024), 3),
+    }]
+    
+    work_dir = tempfile.mkdtemp(prefix="rag-two-stage-")
+    try:
+        np.save(os.path.join(work_dir, FULL_VECTORS_FILE), vectors)
+        
+        for compact in (d for d in dims if d < dim):
+            compact_index = faiss.IndexFlatL2(compact)
+            compact_index.add(truncate_vectors(vectors, compact))
+            faiss.write_index(compact_index, os.path.join(work_dir, COMPACT_INDEX_FILE))
+            searcher = TwoStageSearcher(work_dir)
+            
+            for n_candidates in candidates:
+                found = np.empty((len(queries), k), dtype=np.int64)
+                latencies = []
+                for i in range(len(queries)):
+                    start = time.perf_counter()
+                    _, positions = searcher.search(queries[i:i + 1], k, n_candidates)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    found[i] = positions[0]
+                
+                rows.append({
+                    'config': f"d={compact} c={n_candidates}",
+                    f'recall@{k}': round(recall_at_k(found, truth), 4),
+                    'latency_ms_mean': round(float(np.mean(latencies)), 4),
+                    'latency_ms_p95': round(percentile(latencies, 95), 4),
+                    # Primera etapa completa más las filas candidatas de los vectores completos
+                    'scan_mb': round((len(vectors) * compact + n_candidates * dim) * 4 / (1024 * 1024), 3),
+                })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    print(f"\n{'config':<16}{'recall@' + str(k):>10}{'mean(ms)':>10}{'p95(ms)':>10}{'scan(MB)':>10}")
+    print("-" * 56)
+    for row in rows:
+        print(f"{row['config']:<16}{row[f'recall@{k}']:>10.4f}{row['latency_ms_mean']:>10.4f}"
+              f"{row['latency_ms_p95']:>10.4f}{row['scan_mb']:>10.3f}")
+    
+    return rows
+
+def current_rss_mb(field="VmRSS"):
+    """Memoria residente actual del proceso en MB (RssAnon: solo memoria privada)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _load_worker(persist_dir, mmap, queue):
+    """Carga el vector store en un proceso nuevo (arranque en frío) y reporta tiempo y memoria"""
+    rss_before = current_rss_mb()
+    private_before = current_rss_mb("RssAnon")
+    start = time.perf_counter()
+    vector_store = load_vector_store(persist_dir, None, mmap=mmap)
+    load_time = time.perf_counter() - start
+    
+    # Primera búsqueda: incluye el costo de traer las páginas del índice
+    query = np.zeros((1, vector_store.index.d), dtype=np.float32)
+    start = time.perf_counter()
+    vector_store.index.search(query, 5)
+    first_query = time.perf_counter() - start
+    
+    queue.put({
+        'mode': 'mmap' if mmap else 'eager',
+        'load_ms': round(load_time * 1000, 3),
+        'first_query_ms': round(first_query * 1000, 3),
+        'rss_delta_mb': round(current_rss_mb() - rss_before, 2),
+        # Las páginas mapeadas cuentan en RSS pero se comparten entre procesos
+        'private_delta_mb': round(current_rss_mb("RssAnon") - private_before, 2),
+    })
+
+def load_benchmark(persist_dir, repeats=3):
+    """Compara la carga del índice en RAM contra la carga mapeada en memoria"""
+    context = multiprocessing.get_context("spawn")
+    index_mb = os.path.getsize(os.path.join(persist_dir, "index.faiss")) / (1024 * 1024)
+    print(f"Index file: {index_mb:.1f} MB")
+    
+    rows = []
+    for mmap in (False, True):
+        for _ in range(repeats):
+            queue = context.Queue()
+            process = context.Process(target=_load_worker, args=(persist_dir, mmap, queue))
+            process.start()
+            rows.append(queue.get())
+            process.join()
+    
+    print(f"\n{'mode':<8}{'load(ms)':>12}{'1st query(ms)':>15}{'RSS delta(MB)':>15}{'private(MB)':>13}")
+    print("-" * 63)
+    for row in rows:
+        print(f"{row['mode']:<8}{row['load_ms']:>12.3f}{row['first_query_ms']:>15.3f}"
+              f"{row['rss_delta_mb']:>15.2f}{row['private_delta_mb']:>13.2f}")
+    
+    return rows
+
+def sessions_benchmark(n_sessions=10, isolated=False):
+    """Mide la memoria residente que agrega cada sesión de AIAssistant"""
+    from agent import AIAssistant, SharedResources, get_shared_resources
+    
+    rss_start = current_rss_mb()
+    shared = None if isolated else get_shared_resources().warm_up()
+    rss_shared = current_rss_mb()
+    
+    assistants = []
+    rows = []
+    previous = rss_shared
+    
+    for i in range(n_sessions):
+        assistant = AIAssistant(resources=SharedResources().warm_up() if isolated else shared)
+        # La memoria y el agente de cada sesión se crean al primer mensaje: se construyen antes de medir
+        assistant.memory
+        assistant.agent_executor
+        assistants.append(assistant)
+        rss = current_rss_mb()
+        rows.append({'session': i + 1, 'rss_mb': round(rss, 2), 'delta_mb': round(rss - previous, 2)})
+        previous = rss
+    
+    per_session = (previous - rss_shared) / n_sessions
+    print(f"\nMode: {'isolated' if isolated else 'shared'}")
+    print(f"Shared resources: {rss_shared - rss_start:.2f} MB")
+    print(f"Per additional session: {per_session:.2f} MB (avg over {n_sessions} sessions)")
+    
+    return {
+        'mode': 'isolated' if isolated else 'shared',
+        'shared_mb': round(rss_shared - rss_start, 2),
+        'per_session_mb': round(per_session, 2),
+        'sessions': rows,
+    }
+
+# Pasos del arranque, medidos cada uno en un intérprete nuevo (sin módulos ya importados)
+STARTUP_STEPS = {
+    'import_agent': "import agent",
+    'new_assistant': "import agent; agent.AIAssistant()",
+    'warm_up': "import agent; agent.get_shared_resources().warm_up()",
+}
+
+# Módulos que no deben cargarse solo por importar el asistente
+HEAVY_MODULES = (
+    "langchain_openai", "langchain.agents", "langchain.memory", "langchain_community", "langchain_core",
+    "faiss", "openai", "numpy"
+)
+
+STARTUP_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+{step}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': elapsed * 1000, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def startup_benchmark(repeats=5, steps=tuple(STARTUP_STEPS)):
+    """Tiempo de arranque por paso (import, sesión nueva, precarga) en procesos nuevos"""
+    rows = []
+    for name in steps:
+        script = STARTUP_SCRIPT.format(step=STARTUP_STEPS[name], heavy=HEAVY_MODULES)
+        times = []
+        heavy = []
+        error = None
+        
+        for _ in range(repeats):
+            result = subprocess.run(
+                [sys.executable, "-c", script], cwd=DIRECTORY, capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "error"
+                break
+            data = json.loads(result.stdout.strip().splitlines()[-1])
+            times.append(data['ms'])
+            heavy = data['heavy']
+        
+        row = {'step': name, 'heavy_modules': heavy}
+        if times:
+            row.update({'min_ms': round(min(times), 1), 'median_ms': round(percentile(times, 50), 1)})
+        if error:
+            row['error'] = error
+        rows.append(row)
+    
+    print(f"\n{'step':<16}{'min(ms)':>10}{'median(ms)':>12}  heavy modules")
+    print("-" * 60)
+    for row in rows:
+        if 'error' in row and 'min_ms' not in row:
+            print(f"{row['step']:<16}  {row['error']}")
+            continue
+        print(f"{row['step']:<16}{row['min_ms']:>10.1f}{row['median_ms']:>12.1f}  {', '.join(row['heavy_modules']) or '-'}")
+    
+    return rows
+
+def modes_benchmark(questions=None, repeats=1):
+    """Llamadas al LLM y latencia por pregunta de cada modo del asistente (usa la API configurada)"""
+    from agent import MODES, AIAssistant, get_shared_resources
+    from tracing import Tracer, load_traces
+    
+    questions = questions or BENCHMARK_QUERIES
+    resources = get_shared_resources()
+    rows = []
+    
+    for mode in MODES:
+        # Cada modo escribe sus trazas aparte; de ahí salen las llamadas al LLM y los tokens
+        traces_path = os.path.join(tempfile.mkdtemp(prefix="bench-modes-"), "traces.jsonl")
+        resources.tracer = Tracer(traces_path)
+        assistant = AIAssistant(resources=resources, use_answer_cache=False, mode=mode)
+        assistant.agent_executor.verbose = False
+        
+        for _ in range(repeats):
+            for question in questions:
+                assistant.reset_memory()
+                assistant.chat(question)
+        
+        traces = load_traces(traces_path, last_n=len(questions) * repeats)
+        llm_calls = [sum(1 for span in trace['spans'] if span['name'] == 'llm') for trace in traces]
+        latencies = [trace['duration_ms'] for trace in traces]
+        rows.append({
+            'mode': mode,
+            'requests': len(traces),
+            'llm_calls_mean': round(float(np.mean(llm_calls)), 2),
+            'latency_p50_ms': round(percentile(latencies, 50), 1),
+            'latency_p95_ms': round(percentile(latencies, 95), 1),
+            'prompt_tokens_mean': round(float(np.mean([trace['tokens']['prompt'] for trace in traces])), 1),
+            'completion_tokens_mean': round(float(np.mean([trace['tokens']['completion'] for trace in traces])), 1),
+        })
+    
+    print(f"\n{'mode':<8}{'requests':>10}{'LLM calls':>11}{'p50 ms':>10}{'p95 ms':>10}{'prompt tok':>12}{'compl tok':>11}")
+    for row in rows:
+        print(f"{row['mode']:<8}{row['requests']:>10}{row['llm_calls_mean']:>11.2f}{row['latency_p50_ms']:>10.1f}"
+              f"{row['latency_p95_ms']:>10.1f}{row['prompt_tokens_mean']:>12.1f}{row['completion_tokens_mean']:>11.1f}")
+    
+    return rows
+
+def memory_benchmark(turns=12, memory_tokens=1200):
+    """Tokens de historial que entran al prompt en cada turno: ventana de 5 turnos vs presupuesto con resumen"""
+    from langchain.memory import ConversationBufferWindowMemory
+    from langchain_core.messages import get_buffer_string
+    from agent import get_shared_resources
+    from context_packer import count_tokens
+    from conversation_memory import TokenBudgetMemory
+    
+    memories = {
+        'window': ConversationBufferWindowMemory(memory_key="chat_history", return_messages=True, k=5),
+        'summary': TokenBudgetMemory(
+            llm=get_shared_resources().llm, memory_key="chat_history",
+            return_messages=True, max_tokens=memory_tokens
+        ),
+    }
+    rows = []
+    
+    for turn in range(turns):
+        question = BENCHMARK_QUERIES[turn % len(BENCHMARK_QUERIES)]
+        row = {'turn': turn + 1}
+        
+        for name, memory in memories.items():
+            history = memory.load_memory_variables({})["chat_history"]
+            row[f'{name}_tokens'] = count_tokens(get_buffer_string(history))
+            
+            # save_context es lo que queda en el camino crítico; el resumen corre aparte
+            start = time.perf_counter()
+            memory.save_context({"input": question}, {"output": SAMPLE_ANSWER})
+            row[f'{name}_save_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        
+        # Entre turnos el usuario lee y escribe; se deja terminar el resumen antes del siguiente
+        memories['summary'].wait_for_summary()
+        rows.append(row)
+    
+    print(f"\n{'turn':>5}{'window tok':>12}{'summary tok':>13}{'window save(ms)':>17}{'summary save(ms)':>18}")
+    for row in rows:
+        print(f"{row['turn']:>5}{row['window_tokens']:>12}{row['summary_tokens']:>13}"
+              f"{row['window_save_ms']:>17.3f}{row['summary_save_ms']:>18.3f}")
+    
+    return rows
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def build_synthetic_corpus(pdf_dir, scale, target_dir):
+    """Corpus escalado: scale copias (enlaces) de cada PDF con nombres distintos"""
+    pdfs = sorted(fn for fn in os.listdir(pdf_dir) if fn.endswith('.pdf'))
+    
+    for copy in range(scale):
+        for fn in pdfs:
+            target = os.path.join(target_dir, fn if copy == 0 else f"copy{copy}_{fn}")
+            try:
+                os.symlink(os.path.join(pdf_dir, fn), target)
+            except OSError:
+                shutil.copyfile(os.path.join(pdf_dir, fn), target)
+    
+    return len(pdfs) * scale
+
+def _ingest_memory_worker(pdf_dir, scale, dim, workers, queue):
+    """Construye el índice de un corpus escalado en un proceso nuevo y reporta su pico de memoria"""
+    from vector_creation_and_test import create_vector_store
+    
+    work_dir = tempfile.mkdtemp(prefix="rag-ingest-")
+    corpus_dir = os.path.join(work_dir, "pdfs")
+    persist_dir = os.path.join(work_dir, "vector_store")
+    os.makedirs(corpus_dir)
+    
+    try:
+        n_files = build_synthetic_corpus(pdf_dir, scale, corpus_dir)
+        rss_start = current_rss_mb()
+        vector_store = create_vector_store(
+            corpus_dir, persist_dir, rebuild=True, workers=workers, embeddings=DeterministicEmbeddings(dim)
+        )
+        # Lo retenido (índice y docstore) crece con el corpus por definición; el resto es memoria de trabajo
+        retained_mb = current_rss_mb() - rss_start
+        peak_mb = peak_rss_mb()
+        
+        queue.put({
+            'scale': scale,
+            'files': n_files,
+            'chunks': vector_store.index.ntotal,
+            'peak_rss_mb': round(peak_mb, 1),
+            'retained_mb': round(retained_mb, 1),
+            'working_set_mb': round(peak_mb - rss_start - retained_mb, 1),
+        })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def ingest_memory_benchmark(pdf_dir=DEFAULT_PDF_DIR, scales=(1, 4, 16), dim=1536, workers=1):
+    """Pico de memoria de la ingesta a distintas escalas del corpus, cada una en un proceso limpio"""
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    
+    for scale in scales:
+        queue = context.Queue()
+        process = context.Process(target=_ingest_memory_worker, args=(pdf_dir, scale, dim, workers, queue))
+        process.start()
+        rows.append(queue.get())
+        process.join()
+    
+    print(f"\n{'scale':>6}{'files':>8}{'chunks':>9}{'peak RSS(MB)':>14}{'retained(MB)':>14}{'working set(MB)':>17}")
+    print("-" * 68)
+    for row in rows:
+        print(f"{row['scale']:>6}{row['files']:>8}{row['chunks']:>9}{row['peak_rss_mb']:>14.1f}"
+              f"{row['retained_mb']:>14.1f}{row['working_set_mb']:>17.1f}")
+    
+    return rows
+
+def git_revision():
+    """Commit actual, para identificar la ejecución"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORY, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(pdf_dir=DEFAULT_PDF_DIR, scale=1, dim=1536, workers=1, repeats=20, k=5, index_type="flat"):
+    """Suite completa con embeddings deterministas: ingesta, índice, carga, consultas y memoria"""
+    from vector_creation_and_test import create_vector_store
+    from rag_tool import RAGSearchTool
+    
+    embeddings = DeterministicEmbeddings(dim)
+    work_dir = tempfile.mkdtemp(prefix="rag-bench-")
+    corpus_dir = os.path.join(work_dir, "pdfs")
+    persist_dir = os.path.join(work_dir, "vector_store")
+    os.makedirs(corpus_dir)
+    
+    try:
+        n_files = build_synthetic_corpus(pdf_dir, scale, corpus_dir)
+        print(f"Corpus: {n_files} PDF files (scale x{scale})")
+        
+        # Ingesta completa: lectura, chunking, embeddings e índice
+        start = time.perf_counter()
+        vector_store = create_vector_store(
+            corpus_dir, persist_dir, rebuild=True, workers=workers,
+            index_type=index_type, embeddings=embeddings
+        )
+        ingest_time = time.perf_counter() - start
+        
+        with open(os.path.join(persist_dir, "catalog.json"), encoding='utf-8') as f:
+            n_pages = sum(record.get('total_pages') or 0 for record in json.load(f))
+        n_chunks = vector_store.index.ntotal
+        
+        # Construcción del índice por separado, con los vectores ya calculados
+        vectors = reconstruct_vectors(vector_store.index)
+        start = time.perf_counter()
+        index = create_index(index_type, vectors.shape[1], training_vectors=vectors)
+        index.add(vectors)
+        index_build_time = time.perf_counter() - start
+        del vector_store, vectors, index
+        
+        load_times = {}
+        for mode, mmap in (("eager", False), ("mmap", True)):
+            start = time.perf_counter()
+            load_vector_store(persist_dir, embeddings, mmap=mmap)
+            load_times[mode] = round((time.perf_counter() - start) * 1000, 3)
+        
+        # Latencia de RAGSearchTool._run por modo de búsqueda, sin la LRU de consultas
+        query_latency = {}
+        for search_mode in ("vector", "hybrid", "lexical", "auto"):
+            tool = RAGSearchTool(
+                persist_dir=persist_dir, embeddings=embeddings,
+                search_mode=search_mode, query_cache_size=0
+            )
+            latencies = []
+            for _ in range(repeats):
+                for query in BENCHMARK_QUERIES:
+                    start = time.perf_counter()
+                    tool._run(query, k=k)
+                    latencies.append((time.perf_counter() - start) * 1000)
+            query_latency[search_mode] = {
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'config': {'scale': scale, 'dim': dim, 'workers': workers, 'index_type': index_type, 'k': k},
+        'corpus': {'files': n_files, 'pages': n_pages, 'chunks': n_chunks},
+        'ingest': {
+            'seconds': round(ingest_time, 3),
+            'pages_per_s': round(n_pages / ingest_time, 2),
+            'chunks_per_s': round(n_chunks / ingest_time, 2),
+        },
+        'index_build_s': round(index_build_time, 4),
+        'load_ms': load_times,
+        'query_latency': query_latency,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return results
+
+def _flatten(data, prefix=""):
+    """Aplana un dict anidado a claves con puntos, solo valores numéricos"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare_results(baseline_file, current_file):
+    """Muestra la variación porcentual de cada métrica entre dos ejecuciones"""
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = _flatten(json.load(f))
+    with open(current_file, encoding='utf-8') as f:
+        current = _flatten(json.load(f))
+    
+    print(f"{'metric':<40}{'baseline':>14}{'current':>14}{'change':>10}")
+    print("-" * 78)
+    for name in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[name], current[name]
+        change = f"{(new - old) / old:+.1%}" if old else "-"
+        print(f"{name:<40}{old:>14.3f}{new:>14.3f}{change:>10}")
+
+def write_results(results, output):
+    """Guarda los resultados en JSON para comparar entre ejecuciones"""
+    if not output:
+        return
+    
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del sistema RAG")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    report = subparsers.add_parser("index-report", help="Recall@k vs latencia de cada tipo de índice")
+    report.add_argument("--persist-dir", default=DEFAULT_PERSIST_DIR)
+    report.add_argument("--k", type=int, default=5)
+    report.add_argument("--queries", type=int, default=200)
+    report.add_argument("--scale", type=int, default=1, help="Multiplica el corpus con copias perturbadas")
+    report.add_argument("--output", help="Archivo JSON de resultados")
+    
+    precision = subparsers.add_parser("precision", help="float32 vs float16 vs int8: tamaño, carga, latencia y recall")
+    precision.add_argument("--persist-dir", default=DEFAULT_PERSIST_DIR)
+    precision.add_argument("--index-type", choices=("flat", "ivf", "hnsw"), default="flat")
+    precision.add_argument("--k", type=int, default=5)
+    precision.add_argument("--queries", type=int, default=200)
+    precision.add_argument("--scale", type=int, default=1, help="Multiplica el corpus con copias perturbadas")
+    precision.add_argument("--output", help="Archivo JSON de resultados")
+    
+    two_stage = subparsers.add_parser("two-stage", help="Índice truncado + re-ranking vs búsqueda completa")
+    two_stage.add_argument("--persist-dir", default=DEFAULT_PERSIST_DIR)
+    two_stage.add_argument("--k", type=int, default=5)
+    two_stage.add_argument("--queries", type=int, default=200)
+    two_stage.add_argument("--scale", type=int, default=1, help="Multiplica el corpus con copias perturbadas")
+    two_stage.add_argument("--dims", type=int, nargs="+", default=[128, 256, 512])
+    two_stage.add_argument("--candidates", type=int, nargs="+", default=[20, 50, 100])
+    two_stage.add_argument("--output", help="Archivo JSON de resultados")
+    
+    load = subparsers.add_parser("load", help="Tiempo de carga y memoria: índice en RAM vs mmap")
+    load.add_argument("--persist-dir", default=DEFAULT_PERSIST_DIR)
+    load.add_argument("--repeats", type=int, default=3)
+    load.add_argument("--output", help="Archivo JSON de resultados")
+    
+    sessions = subparsers.add_parser("sessions", help="Memoria residente por sesión adicional del asistente")
+    sessions.add_argument("--sessions", type=int, default=10)
+    sessions.add_argument("--isolated", action="store_true", help="Cada sesión crea sus propios recursos (comportamiento anterior)")
+    sessions.add_argument("--output", help="Archivo JSON de resultados")
+    
+    modes = subparsers.add_parser("modes", help="Llamadas al LLM y latencia: agente vs recuperación directa")
+    modes.add_argument("--repeats", type=int, default=1)
+    modes.add_argument("--output", help="Archivo JSON de resultados")
+    
+    startup = subparsers.add_parser("startup", help="Tiempo de import y arranque del asistente en procesos nuevos")
+    startup.add_argument("--repeats", type=int, default=5)
+    startup.add_argument("--steps", nargs="+", choices=list(STARTUP_STEPS), default=list(STARTUP_STEPS))
+    startup.add_argument("--max-import-ms", type=float, help="Falla si 'import agent' supera este tiempo (mediana)")
+    startup.add_argument("--output", help="Archivo JSON de resultados")
+    
+    memory = subparsers.add_parser("memory", help="Tokens de historial por turno: ventana vs resumen acotado")
+    memory.add_argument("--turns", type=int, default=12)
+    memory.add_argument("--memory-tokens", type=int, default=1200)
+    memory.add_argument("--output", help="Archivo JSON de resultados")
+    
+    ingest = subparsers.add_parser("ingest-memory", help="Pico de memoria de la ingesta al escalar el corpus")
+    ingest.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    ingest.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16])
+    ingest.add_argument("--dim", type=int, default=1536)
+    ingest.add_argument("--workers", type=int, default=1)
+    ingest.add_argument("--output", help="Archivo JSON de resultados")
+    
+    suite = subparsers.add_parser("suite", help="Suite completa offline con embeddings deterministas")
+    suite.add_argument("--pdf-dir", default=DEFAULT_PDF_DIR)
+    suite.add_argument("--scale", type=int, default=1, help="Multiplica el corpus (p. ej. 10 o 100)")
+    suite.add_argument("--dim", type=int, default=1536)
+    suite.add_argument("--workers", type=int, default=1)
+    suite.add_argument("--repeats", type=int, default=20)
+    suite.add_argument("--index-type", default="flat")
+    suite.add_argument("--output", help="Archivo JSON de resultados (por defecto en bench_results/)")
+    
+    compare = subparsers.add_parser("compare", help="Compara dos archivos de resultados de la suite")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    
+    args = parser.parse_args()
+    
+    if args.command == "index-report":
+        write_results(index_report(args.persist_dir, args.k, args.queries, args.scale), args.output)
+    elif args.command == "precision":
+        write_results(
+            precision_report(args.persist_dir, args.k, args.queries, args.scale, args.index_type), args.output
+        )
+    elif args.command == "two-stage":
+        write_results(
+            two_stage_report(args.persist_dir, args.k, args.queries, args.scale, args.dims, args.candidates),
+            args.output
+        )
+    elif args.command == "load":
+        write_results(load_benchmark(args.persist_dir, args.repeats), args.output)
+    elif args.command == "sessions":
+        write_results(sessions_benchmark(args.sessions, args.isolated), args.output)
+    elif args.command == "modes":
+        write_results(modes_benchmark(repeats=args.repeats), args.output)
+    elif args.command == "startup":
+        rows = startup_benchmark(args.repeats, args.steps)
+        write_results(rows, args.output)
+        
+        # Regresiones: el import del asistente no debe volver a cargar LangChain/FAISS ni pasarse del límite
+        import_row = next((row for row in rows if row['step'] == 'import_agent'), None)
+        if import_row and (import_row['heavy_modules'] or 'error' in import_row or (
+                args.max_import_ms and import_row['median_ms'] > args.max_import_ms)):
+            print("\n'import agent' es más lento o pesado de lo esperado")
+            sys.exit(1)
+    elif args.command == "memory":
+        write_results(memory_benchmark(args.turns, args.memory_tokens), args.output)
+    elif args.command == "ingest-memory":
+        write_results(ingest_memory_benchmark(args.pdf_dir, args.scales, args.dim, args.workers), args.output)
+    elif args.command == "suite":
+        output = args.output or os.path.join(
+            RESULTS_DIR, f"suite-x{args.scale}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        results = run_suite(args.pdf_dir, args.scale, args.dim, args.workers, args.repeats, index_type=args.index_type)
+        write_results(results, output)
+    elif args.command == "compare":
+        compare_results(args.baseline, args.current)
@@ -0,0 +1,110 @@
+import os
+import re
+import math
+import pickle
+import unicodedata
+
+BM25_FILE = "bm25.pkl"
+
+STOPWORDS = {
+    'a', 'al', 'de', 'del', 'el', 'la', 'las', 'lo', 'los', 'un', 'una', 'y', 'o', 'en', 'con',
+    'por', 'para', 'que', 'se', 'es', 'su', 'sus', 'como', 'the', 'of', 'and', 'to', 'in'
+}
+
+def tokenize(text):
+    """Tokens en minúscula y sin tildes, sin stopwords"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [token for token in re.findall(r"\w+", text) if token not in STOPWORDS]
+
+class BM25Index:
+    """Índice invertido BM25 sobre los mismos chunks del vector store"""
+    
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []
+        self.doc_lengths = []
+        self.postings = {}
+        self.avg_length = 0.0
+    
+    @classmethod
+    def from_vector_store(cls, vector_store, **kwargs):
+        """Construye el índice a partir del docstore (solo texto local, sin red)"""
+        index = cls(**kwargs)
+        doc_ids = list(vector_store.index_to_docstore_id.values())
+        index.build(doc_ids, (vector_store.docstore.search(doc_id).page_content for doc_id in doc_ids))
+        return index
+    
+    def build(self, doc_ids, texts):
+        """Indexa los textos; cada posting guarda (posición del documento, frecuencia)"""
+        self.doc_ids = list(doc_ids)
+        self.doc_lengths = []
+        self.postings = {}
+        
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.doc_lengths.append(len(tokens))
+            
+            frequencies = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, frequency in frequencies.items():
+                self.postings.setdefault(token, []).append((position, frequency))
+        
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+    
+    def has_terms(self, query):
+        """Indica si todos los términos de la consulta aparecen en el vocabulario"""
+        tokens = tokenize(query)
+        return bool(tokens) and all(token in self.postings for token in tokens)
+    
+    def search(self, query, k=5):
+        """Devuelve [(doc_id, score)] ordenados por score BM25 descendente"""
+        n_docs = len(self.doc_ids)
+        scores = {}
+        
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / self.avg_length)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.doc_ids[position], score) for position, score in ranked]
+    
+    def save(self, persist_dir):
+        """Guarda el índice junto al vector store"""
+        index_file = os.path.join(persist_dir, BM25_FILE)
+        tmp_file = index_file + '.tmp'
+        
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(self.__dict__, f)
+        
+        os.replace(tmp_file, index_file)
+    
+    @classmethod
+    def load(cls, persist_dir):
+        """Carga el índice guardado, o None si no existe"""
+        index_file = os.path.join(persist_dir, BM25_FILE)
+        
+        if not os.path.exists(index_file):
+            return None
+        
+        index = cls()
+        with open(index_file, 'rb') as f:
+            index.__dict__.update(pickle.load(f))
+        return index
+
+def reciprocal_rank_fusion(rankings, k=5, constant=60):
+    """Fusiona varias listas ordenadas de doc_ids con Reciprocal Rank Fusion"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (constant + rank + 1)
+    
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
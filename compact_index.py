@@ -0,0 +1,106 @@
+import os
+import json
+import threading
+import faiss
+import numpy as np
+from index_factory import reconstruct_vectors
+from vector_store_io import mmap_flags, vector_store_version
+
+COMPACT_INDEX_FILE = "compact.faiss"
+FULL_VECTORS_FILE = "full_vectors.npy"
+COMPACT_INFO_FILE = "compact.json"  # Versión del índice principal con que se construyó el compacto
+COMPACT_DIM = 256
+RERANK_CANDIDATES = 50
+
+def truncate_vectors(vectors, dim):
+    """Primeras dim dimensiones renormalizadas (los embeddings text-embedding-3 admiten acortarse así)"""
+    truncated = np.ascontiguousarray(vectors[:, :dim], dtype=np.float32)
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-12)
+
+def saved_compact_dim(persist_dir):
+    """Dimensión del índice compacto guardado, o None si no existe"""
+    path = os.path.join(persist_dir, COMPACT_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    return faiss.read_index(path, mmap_flags()).d
+
+def compact_index_is_current(persist_dir):
+    """Indica si el índice compacto se construyó con la versión guardada del índice principal"""
+    try:
+        with open(os.path.join(persist_dir, COMPACT_INFO_FILE), encoding='utf-8') as f:
+            index_version = json.load(f).get('index_version')
+    except (OSError, ValueError):
+        return False
+    return index_version is not None and index_version == vector_store_version(persist_dir)
+
+def build_compact_index(vector_store, persist_dir, dim=COMPACT_DIM):
+    """Guarda el índice compacto de primera etapa y los vectores completos para el re-ranking"""
+    vectors = reconstruct_vectors(vector_store.index)
+    
+    if dim >= vectors.shape[1]:
+        print(f"Compact dimension {dim} is not smaller than {vectors.shape[1]}, skipping compact index")
+        return None
+    
+    # Las posiciones coinciden con las del índice principal (index_to_docstore_id)
+    np.save(os.path.join(persist_dir, FULL_VECTORS_FILE), np.ascontiguousarray(vectors, dtype=np.float32))
+    
+    index = faiss.IndexFlatL2(dim)
+    index.add(truncate_vectors(vectors, dim))
+    faiss.write_index(index, os.path.join(persist_dir, COMPACT_INDEX_FILE))
+    
+    # Se guarda después del índice principal: si este cambia, el compacto queda marcado como viejo
+    with open(os.path.join(persist_dir, COMPACT_INFO_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'index_version': vector_store_version(persist_dir), 'dim': dim}, f)
+    
+    print(f"Compact index saved: {index.ntotal} vectors of dim {dim}")
+    return index
+
+class TwoStageSearcher:
+    """Búsqueda en dos etapas: candidatos en el índice compacto y re-ranking exacto con los vectores completos"""
+    
+    def __init__(self, persist_dir, mmap=True):
+        self.persist_dir = persist_dir
+        self.index = faiss.read_index(
+            os.path.join(persist_dir, COMPACT_INDEX_FILE), mmap_flags() if mmap else 0
+        )
+        self._full_vectors = None
+        self._lock = threading.Lock()
+    
+    def is_current(self):
+        return compact_index_is_current(self.persist_dir)
+    
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+    
+    @property
+    def full_vectors(self):
+        """Vectores completos mapeados en memoria; solo las filas candidatas llegan a RAM"""
+        if self._full_vectors is None:
+            with self._lock:
+                if self._full_vectors is None:
+                    self._full_vectors = np.load(
+                        os.path.join(self.persist_dir, FULL_VECTORS_FILE), mmap_mode='r'
+                    )
+        return self._full_vectors
+    
+    def search(self, queries, k, candidates=RERANK_CANDIDATES):
+        """Misma salida que index.search: (distancias L2², posiciones) de forma (n, k), -1 si faltan"""
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        candidates = min(max(candidates, k), self.index.ntotal)
+        
+        # Etapa 1: candidatos con los vectores truncados
+        _, positions = self.index.search(truncate_vectors(queries, self.index.d), candidates)
+        
+        # Etapa 2: distancias exactas de todos los candidatos de todas las consultas en una operación
+        valid = positions >= 0
+        rows = self.full_vectors[np.where(valid, positions, 0)]
+        distances = np.sum((rows - queries[:, None, :]) ** 2, axis=2)
+        distances[~valid] = np.inf
+        
+        order = np.argsort(distances, axis=1)[:, :k]
+        top_distances = np.take_along_axis(distances, order, axis=1)
+        top_positions = np.where(np.isinf(top_distances), -1, np.take_along_axis(positions, order, axis=1))
+        
+        return top_distances.astype(np.float32), top_positions
@@ -0,0 +1,166 @@
+from functools import lru_cache
+
+DEFAULT_TOKEN_BUDGET = 1500
+MIN_OVERLAP = 20
+MAX_OVERLAP = 400  # Mayor que el chunk_overlap del splitter, que puede cortar en otro separador
+MIN_TRUNCATED_TOKENS = 50
+
+@lru_cache(maxsize=1)
+def _encoder():
+    """Tokenizador de gpt-4o-mini; None si tiktoken no está disponible"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def count_tokens(text):
+    """Tokens del texto (aproximado a 4 caracteres por token sin tiktoken)"""
+    encoder = _encoder()
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+def truncate_tokens(text, max_tokens):
+    """Recorta el texto a max_tokens, terminando en un límite de palabra"""
+    encoder = _encoder()
+    if encoder is None:
+        truncated = text[:max_tokens * 4]
+    else:
+        tokens = encoder.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        truncated = encoder.decode(tokens[:max_tokens])
+    
+    if len(truncated) < len(text) and " " in truncated:
+        truncated = truncated.rsplit(" ", 1)[0]
+    return truncated.rstrip() + "..."
+
+def _overlap(left, right):
+    """Largo del sufijo de left que coincide con un prefijo de right (0 si es menor a MIN_OVERLAP)"""
+    for size in range(min(len(left), len(right), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def merge_texts(first, second):
+    """Une dos fragmentos contiguos o solapados; None si no comparten texto"""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    
+    size = _overlap(first, second)
+    if size:
+        return first + second[size:]
+    
+    size = _overlap(second, first)
+    if size:
+        return second + first[size:]
+    
+    return None
+
+class ContextBlock:
+    """Texto contiguo de una misma página, armado a partir de uno o más chunks"""
+    
+    def __init__(self, doc, score):
+        self.metadata = doc.metadata
+        self.key = (doc.metadata.get('filename'), doc.metadata.get('page'))
+        self.text = doc.page_content
+        self.score = score
+        self.chunks = 1
+    
+    def merge(self, text):
+        merged = merge_texts(self.text, text)
+        if merged is None:
+            return False
+        self.text = merged
+        self.chunks += 1
+        return True
+
+def _merge_blocks(results):
+    """Agrupa los chunks por página fusionando los que se solapan, en orden de ranking"""
+    blocks = []
+    
+    for doc, score in results:
+        candidates = [block for block in blocks if block.key == (doc.metadata.get('filename'), doc.metadata.get('page'))]
+        target = next((block for block in candidates if block.merge(doc.page_content)), None)
+        
+        if target is None:
+            blocks.append(ContextBlock(doc, score))
+            continue
+        
+        # Un chunk puede unir dos bloques de la misma página que antes no se tocaban
+        for block in candidates:
+            if block is not target and target.merge(block.text):
+                target.chunks += block.chunks - 1
+                blocks.remove(block)
+    
+    return blocks
+
+def _unseen_text(text, spans):
+    """Parte del texto que no está en los tramos ya mostrados de la página ("" si no aporta nada)"""
+    for span in spans:
+        if text in span:
+            return ""
+        
+        if span in text:
+            # El bloque contiene lo ya mostrado: quedan el texto anterior y el posterior
+            before, after = text.split(span, 1)
+            text = " ... ".join(part.strip() for part in (before, after) if part.strip())
+            continue
+        
+        size = _overlap(span, text)
+        if size:
+            text = text[size:]
+        
+        size = _overlap(text, span)
+        if size:
+            text = text[:-size]
+    
+    return text.strip()
+
+def _remember(spans, text):
+    """Agrega el texto a los tramos mostrados de la página, fusionándolo con los que se solapan"""
+    for i, span in enumerate(spans):
+        merged = merge_texts(span, text)
+        if merged is not None:
+            spans.pop(i)
+            return _remember(spans, merged)
+    spans.append(text)
+
+def pack_context(results, token_budget=DEFAULT_TOKEN_BUDGET, seen=None):
+    """
+    Fusiona los chunks solapados o contiguos de una misma página, descarta texto repetido
+    y llena el presupuesto de tokens en orden de ranking; devuelve [(bloque, tokens)].
+    seen ({(archivo, página): [tramos]}) acumula lo ya mostrado entre subconsultas
+    """
+    seen = seen if seen is not None else {}
+    packed = []
+    remaining = token_budget
+    
+    for block in _merge_blocks(results):
+        spans = seen.setdefault(block.key, [])
+        original = block.text
+        block.text = _unseen_text(original, spans)
+        if not block.text:
+            continue
+        
+        tokens = count_tokens(block.text)
+        if tokens > remaining:
+            # El primer bloque que no cabe entra recortado si queda espacio útil
+            if remaining < MIN_TRUNCATED_TOKENS:
+                continue
+            block.text = truncate_tokens(block.text, remaining - 1)  # Un token para los puntos suspensivos
+            tokens = count_tokens(block.text)
+            _remember(spans, block.text.removesuffix("..."))
+        else:
+            _remember(spans, original)
+        
+        packed.append((block, tokens))
+        remaining -= tokens
+        
+        if remaining < MIN_TRUNCATED_TOKENS:
+            break
+    
+    return packed
@@ -0,0 +1,139 @@
+import re
+import threading
+from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import PrivateAttr
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+from context_packer import count_tokens
+from tracing import record_event
+
+DEFAULT_MEMORY_TOKENS = 1200
+
+SUMMARY_PROMPT = """Resume de forma progresiva una conversación entre un estudiante y el asistente del curso de Inteligencia Artificial.
+Conserva los temas preguntados, las conclusiones y las semanas o autores de los apuntes mencionados, en pocas oraciones y sin fórmulas largas.
+
+Resumen actual:
+{summary}
+
+Nuevas líneas de la conversación:
+{new_lines}
+
+Nuevo resumen:"""
+
+SOURCES_PATTERN = re.compile(r"\*\*Fuentes:\*\*.*", re.DOTALL)
+
+# Los resúmenes se calculan fuera del camino crítico de la respuesta
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+class TokenBudgetMemory(BaseChatMemory):
+    """Memoria acotada por tokens: los turnos viejos se condensan en un resumen calculado en segundo plano"""
+    
+    llm: Any
+    memory_key: str = "chat_history"
+    max_tokens: int = DEFAULT_MEMORY_TOKENS
+    summary: str = ""
+    
+    _summarized: int = PrivateAttr(default=0)  # Mensajes ya condensados en el resumen (y descartados)
+    _generation: int = PrivateAttr(default=0)  # Cambia con clear() para descartar resúmenes en curso
+    _pending: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+    
+    def _summary_message(self, summary):
+        return SystemMessage(content=f"Resumen de la conversación anterior: {summary}")
+    
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Resumen más los mensajes recientes que caben en el presupuesto de tokens"""
+        with self._lock:
+            summary = self.summary
+            messages = list(self.chat_memory.messages)
+        
+        # Si el resumen aún no alcanzó al historial, se recorta igual: primero los mensajes más nuevos
+        used = count_tokens(summary) if summary else 0
+        kept = []
+        for message in reversed(messages):
+            tokens = count_tokens(message.content)
+            if kept and used + tokens > self.max_tokens:
+                break
+            kept.append(message)
+            used += tokens
+        
+        history: List[BaseMessage] = ([self._summary_message(summary)] if summary else []) + kept[::-1]
+        record_event("memory", tokens=used, messages=len(kept), summarized=self._summarized)
+        
+        return {self.memory_key: history if self.return_messages else get_buffer_string(history)}
+    
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self._schedule_summary()
+    
+    def _schedule_summary(self):
+        """Si el historial no resumido excede el presupuesto, resume los turnos más viejos en otro thread"""
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return
+            
+            messages = list(self.chat_memory.messages)
+            tokens = [count_tokens(message.content) for message in messages]
+            budget = self.max_tokens - (count_tokens(self.summary) if self.summary else 0)
+            
+            # Se pliegan turnos completos (pregunta y respuesta), conservando siempre el último
+            fold = 0
+            while sum(tokens[fold:]) > budget and len(messages) - fold > 2:
+                fold += 2
+            
+            if not fold:
+                return
+            
+            self._pending = _summary_executor.submit(
+                self._summarize, self.summary, messages[:fold], self._generation
+            )
+    
+    def _summarize(self, summary, messages, generation):
+        # Los bloques de fuentes no aportan al resumen
+        new_lines = get_buffer_string([
+            message.model_copy(update={"content": SOURCES_PATTERN.sub("", str(message.content)).strip()})
+            for message in messages
+        ])
+        
+        try:
+            new_summary = self.llm.invoke(
+                SUMMARY_PROMPT.format(summary=summary or "(vacío)", new_lines=new_lines)
+            ).content.strip()
+        except Exception as e:
+            print(f"Conversation summary failed: {e}")
+            return
+        
+        with self._lock:
+            if generation != self._generation:
+                return
+            self.summary = new_summary
+            # Los mensajes resumidos se descartan: chat_memory no crece sin límite en sesiones largas.
+            # Solo se agregan mensajes al final, así que los plegados siguen siendo los primeros
+            del self.chat_memory.messages[:len(messages)]
+            self._summarized += len(messages)
+            self._pending = None
+        
+        # Puede haber llegado otro turno mientras se resumía
+        self._schedule_summary()
+    
+    def wait_for_summary(self, timeout=None):
+        """Espera a que termine el resumen en curso (útil en benchmarks y scripts)"""
+        while True:
+            with self._lock:
+                pending = self._pending
+            if pending is None or pending.done():
+                return
+            pending.result(timeout=timeout)
+    
+    def clear(self) -> None:
+        super().clear()
+        with self._lock:
+            self.summary = ""
+            self._summarized = 0
+            self._generation += 1
+            self._pending = None
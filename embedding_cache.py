@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from tracing import trace_span, record_event
+
+def normalize_text(text):
+    """Normaliza unicode y espacios para que textos equivalentes compartan entrada"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class EmbeddingCache:
+    """Cache persistente de embeddings en SQLite, con clave (modelo, hash del texto) y expulsión LRU"""
+    
+    def __init__(self, path, max_entries=200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT, vector BLOB, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.commit()
+    
+    @staticmethod
+    def make_key(model, text):
+        """Clave de cache: hash del modelo y del texto normalizado"""
+        payload = f"{model}\0{normalize_text(text)}".encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+    
+    def get_many(self, model, texts):
+        """Devuelve el vector cacheado de cada texto, o None si no está"""
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+            
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        
+        return [
+            np.frombuffer(found[key], dtype=np.float32) if key in found else None
+            for key in keys
+        ]
+    
+    def put_many(self, model, texts, vectors):
+        """Guarda vectores en la cache y expulsa las entradas menos usadas si se excede el límite"""
+        now = time.time()
+        rows = [
+            (self.make_key(model, text), model, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            
+            self._conn.commit()
+    
+    def stats(self):
+        """Estadísticas de uso de la cache en este proceso"""
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': entries
+        }
+
+class CachedEmbeddings(Embeddings):
+    """Envuelve un cliente de embeddings y solo llama a la API para textos no cacheados"""
+    
+    def __init__(self, embeddings, cache, model):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+    
+    def embed_documents(self, texts):
+        cached = self.cache.get_many(self.model, texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        record_event("embedding_cache", hits=len(texts) - len(missing), misses=len(missing))
+        
+        if missing:
+            # Textos repetidos dentro del mismo lote se embeben una sola vez
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            with trace_span("embedding.api", texts=len(unique_texts)):
+                vectors = self.embeddings.embed_documents(unique_texts)
+            self.cache.put_many(self.model, unique_texts, vectors)
+            
+            by_text = dict(zip(unique_texts, vectors))
+            for i in missing:
+                cached[i] = np.asarray(by_text[texts[i]], dtype=np.float32)
+        
+        return [vector.tolist() for vector in cached]
+    
+    async def aembed_documents(self, texts):
+        # Las lecturas y escrituras de SQLite corren en un hilo para no bloquear el event loop
+        cached = await asyncio.to_thread(self.cache.get_many, self.model, texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        record_event("embedding_cache", hits=len(texts) - len(missing), misses=len(missing))
+        
+        if missing:
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            with trace_span("embedding.api", texts=len(unique_texts)):
+                vectors = await self.embeddings.aembed_documents(unique_texts)
+            await asyncio.to_thread(self.cache.put_many, self.model, unique_texts, vectors)
+            
+            by_text = dict(zip(unique_texts, vectors))
+            for i in missing:
+                cached[i] = np.asarray(by_text[texts[i]], dtype=np.float32)
+        
+        return [vector.tolist() for vector in cached]
+    
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+    
+    def embed_query(self, text):
+        vector = self.cache.get_many(self.model, [text])[0]
+        
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many(self.model, [text], [vector])
+            return list(vector)
+        
+        return vector.tolist()
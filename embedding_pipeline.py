@@ -0,0 +1,130 @@
+import os
+import time
+import random
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from langchain_openai import OpenAIEmbeddings
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings.sqlite")
+
+_caches = {}
+
+def get_embedding_cache(path=EMBEDDING_CACHE_PATH):
+    """Devuelve la cache de embeddings del proceso para una ruta dada"""
+    if path not in _caches:
+        _caches[path] = EmbeddingCache(path)
+    return _caches[path]
+
+def get_embeddings(model=EMBEDDING_MODEL, cache=True):
+    """Crea el cliente de embeddings, apuntando a un servidor local si EMBEDDINGS_BASE_URL está definido"""
+    base_url = os.getenv("EMBEDDINGS_BASE_URL")
+    
+    if not base_url:
+        embeddings = OpenAIEmbeddings(model=model)
+    else:
+        # El servidor local recibe texto plano, sin tokenizar con tiktoken
+        embeddings = OpenAIEmbeddings(
+            model=model,
+            base_url=base_url,
+            api_key=os.getenv("OPENAI_API_KEY", "local"),
+            check_embedding_ctx_length=False
+        )
+    
+    if not cache:
+        return embeddings
+    
+    # Separar la cache por endpoint para no mezclar vectores del servidor local con los reales
+    cache_model = f"{model}@{base_url}" if base_url else model
+    return CachedEmbeddings(embeddings, get_embedding_cache(), cache_model)
+
+class BatchEmbedder:
+    """Embebe textos en lotes concurrentes con límite de peticiones en vuelo, reintentos y checkpoints"""
+    
+    def __init__(self, embeddings, batch_size=64, max_in_flight=4, max_retries=5,
+                 backoff=1.0, checkpoint_dir=None, model=EMBEDDING_MODEL):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.checkpoint_dir = checkpoint_dir
+        self.model = model
+        
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+    
+    def _checkpoint_path(self, batch):
+        """Ruta del checkpoint de un lote, identificado por modelo y contenido"""
+        if not self.checkpoint_dir:
+            return None
+        
+        digest = hashlib.sha256(self.model.encode('utf-8'))
+        for text in batch:
+            digest.update(b'\0')
+            digest.update(text.encode('utf-8'))
+        
+        return os.path.join(self.checkpoint_dir, f"{digest.hexdigest()}.npy")
+    
+    def _embed_batch(self, batch):
+        """Embebe un lote, reutilizando su checkpoint y reintentando con backoff exponencial"""
+        checkpoint = self._checkpoint_path(batch)
+        
+        if checkpoint and os.path.exists(checkpoint):
+            return np.load(checkpoint)
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = np.asarray(self.embeddings.embed_documents(batch), dtype=np.float32)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                print(f"  Embedding batch failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+        
+        if checkpoint:
+            tmp_file = checkpoint + '.tmp.npy'
+            np.save(tmp_file, vectors)
+            os.replace(tmp_file, checkpoint)
+        
+        return vectors
+    
+    def embed_batches(self, batches):
+        """Embebe un iterable de lotes y los devuelve en orden, con a lo sumo max_in_flight pendientes"""
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            pending = []
+            
+            for batch in batches:
+                pending.append((batch, executor.submit(self._embed_batch, batch)))
+                
+                # Backpressure: no pedir más lotes hasta que termine el más antiguo
+                if len(pending) >= self.max_in_flight:
+                    batch, future = pending.pop(0)
+                    yield batch, future.result()
+            
+            for batch, future in pending:
+                yield batch, future.result()
+    
+    def embed(self, texts):
+        """Embebe una lista de textos y devuelve una matriz float32 en el mismo orden"""
+        batches = (texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size))
+        results = [vectors for _, vectors in self.embed_batches(batches)]
+        
+        if not results:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        return np.vstack(results)
+    
+    def clear_checkpoints(self):
+        """Elimina los checkpoints una vez que el índice quedó guardado"""
+        if not self.checkpoint_dir or not os.path.exists(self.checkpoint_dir):
+            return
+        
+        for fn in os.listdir(self.checkpoint_dir):
+            if fn.endswith('.npy'):
+                os.remove(os.path.join(self.checkpoint_dir, fn))
@@ -0,0 +1,82 @@
+import json
+import base64
+import random
+import hashlib
+import argparse
+import time
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def fake_embedding(text, dim):
+    """Vector determinista y normalizado derivado del hash del texto"""
+    seed = int.from_bytes(hashlib.sha256(str(text).encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+class EmbeddingHandler(BaseHTTPRequestHandler):
+    """Imita el endpoint /v1/embeddings de OpenAI"""
+    
+    dim = 1536
+    failure_rate = 0.0
+    latency = 0.0
+    
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/embeddings'):
+            self.send_error(404)
+            return
+        
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length))
+        
+        if self.latency:
+            time.sleep(self.latency)
+        
+        # Fallas simuladas para probar los reintentos del pipeline
+        if random.random() < self.failure_rate:
+            self.send_error(500, "Simulated failure")
+            return
+        
+        inputs = payload.get('input', [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        
+        data = []
+        for i, item in enumerate(inputs):
+            vector = fake_embedding(item, self.dim)
+            if payload.get('encoding_format') == 'base64':
+                embedding = base64.b64encode(vector.astype('<f4').tobytes()).decode('ascii')
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        
+        body = json.dumps({
+            "object": "list",
+            "data": data,
+            "model": payload.get('model', 'fake'),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        }).encode('utf-8')
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local de embeddings deterministas para pruebas")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probabilidad de responder con error 500")
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por petición")
+    args = parser.parse_args()
+    
+    EmbeddingHandler.dim = args.dim
+    EmbeddingHandler.failure_rate = args.failure_rate
+    EmbeddingHandler.latency = args.latency
+    
+    print(f"Fake embedding server on http://localhost:{args.port}/v1")
+    print(f"Usar con: EMBEDDINGS_BASE_URL=http://localhost:{args.port}/v1")
+    ThreadingHTTPServer(('localhost', args.port), EmbeddingHandler).serve_forever()
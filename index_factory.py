@@ -0,0 +1,126 @@
+import math
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+PRECISIONS = ("float32", "float16", "int8")
+DEFAULT_PRECISION = "float32"
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+
+def default_nlist(n_vectors):
+    """Número de listas IVF: ~4·sqrt(n), con al menos 39 puntos de entrenamiento por lista"""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+def default_pq_m(dim):
+    """Mayor número de subcuantizadores PQ (≤ 96) que divide la dimensión"""
+    for m in range(min(96, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def _scalar_quantizer_type(precision):
+    """Tipo de cuantizador escalar de FAISS para la precisión pedida (None para float32)"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+    
+    return {
+        "float32": None,
+        "float16": faiss.ScalarQuantizer.QT_fp16,
+        "int8": faiss.ScalarQuantizer.QT_8bit,
+    }[precision]
+
+def create_index(index_type, dim, training_vectors=None, nlist=None, hnsw_m=32, pq_m=None,
+                 precision=DEFAULT_PRECISION):
+    """Crea un índice FAISS vacío del tipo pedido, entrenado con el corpus si hace falta"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    
+    # float16 guarda 2 bytes por dimensión e int8 1 byte (rango aprendido por dimensión)
+    qtype = _scalar_quantizer_type(precision)
+    if qtype is not None and index_type == "ivfpq":
+        raise ValueError("Index type 'ivfpq' is already compressed, precision must be float32")
+    
+    if needs_training(index_type, precision) and (training_vectors is None or len(training_vectors) == 0):
+        raise ValueError(f"Index type '{index_type}' with precision '{precision}' needs training vectors")
+    
+    if training_vectors is not None:
+        training_vectors = np.ascontiguousarray(training_vectors, dtype=np.float32)
+    
+    if index_type == "flat":
+        if qtype is None:
+            return faiss.IndexFlatL2(dim)
+        index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+        # float16 no necesita entrenamiento; int8 aprende el rango de cada dimensión
+        if training_vectors is not None:
+            index.train(training_vectors)
+        return index
+    
+    if index_type == "hnsw":
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        else:
+            index = faiss.IndexHNSWSQ(dim, qtype, hnsw_m)
+            if training_vectors is not None:
+                index.train(training_vectors)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = DEFAULT_EF_SEARCH
+        return index
+    
+    nlist = nlist or default_nlist(len(training_vectors))
+    quantizer = faiss.IndexFlatL2(dim)
+    
+    if index_type == "ivf":
+        if qtype is None:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, faiss.METRIC_L2)
+    else:
+        # Con pocos vectores se reducen los bits por código para poder entrenar PQ
+        nbits = max(1, min(8, int(math.log2(len(training_vectors))) - 2))
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m or default_pq_m(dim), nbits)
+    
+    index.train(training_vectors)
+    index.nprobe = min(DEFAULT_NPROBE, nlist)
+    return index
+
+def needs_training(index_type, precision=DEFAULT_PRECISION):
+    """Indica si el tipo de índice se entrena con vectores del corpus antes de agregarlos"""
+    return index_type in ("ivf", "ivfpq") or precision == "int8"
+
+def supports_removal(index):
+    """Indica si el índice permite borrar vectores (HNSW e IVF no lo permiten)"""
+    # IVF borra sin compactar las posiciones, pero FAISS.delete de LangChain renumera
+    # index_to_docstore_id como si lo hiciera: los índices IVF se reconstruyen
+    if faiss.try_extract_index_ivf(index) is not None:
+        return False
+    return not isinstance(faiss.downcast_index(index), faiss.IndexHNSW)
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Ajusta los parámetros de búsqueda (nprobe para IVF, efSearch para HNSW)"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    
+    hnsw = faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW) and ef_search:
+        hnsw.hnsw.efSearch = ef_search
+
+def index_precision(index):
+    """Precisión con que el índice guarda los vectores (float32 si no usa cuantización escalar)"""
+    sq = getattr(faiss.downcast_index(index), 'sq', None)
+    if sq is None:
+        # HNSWSQ guarda los vectores en su storage
+        storage = getattr(faiss.downcast_index(index), 'storage', None)
+        sq = getattr(faiss.downcast_index(storage), 'sq', None) if storage is not None else None
+    if sq is None:
+        return "float32"
+    return {faiss.ScalarQuantizer.QT_fp16: "float16", faiss.ScalarQuantizer.QT_8bit: "int8"}.get(sq.qtype, "float32")
+
+def reconstruct_vectors(index):
+    """Recupera todos los vectores almacenados en el índice, en orden de posición"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    
+    return index.reconstruct_n(0, index.ntotal)
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import unicodedata
+
+CATALOG_FILE = "catalog.json"
+CATALOG_FIELDS = ('filename', 'semana', 'autor', 'fecha', 'parte', 'total_pages')
+
+def normalize_name(text):
+    """Minúsculas y sin tildes, para comparar nombres de autores"""
+    text = unicodedata.normalize('NFKD', text)
+    return " ".join(''.join(c for c in text if not unicodedata.combining(c)).lower().split())
+
+class MetadataCatalog:
+    """Catálogo de metadata por archivo, indexado por semana, autor, fecha y nombre de archivo"""
+    
+    def __init__(self, records):
+        self.records = sorted(
+            records, key=lambda r: (r.get('semana') or 0, r.get('fecha') or '', r.get('parte') or 0, r['filename'])
+        )
+        self.by_week = {}
+        self.by_author = {}
+        self.by_date = {}
+        self.by_file = {}
+        
+        for record in self.records:
+            self.by_file[record['filename']] = record
+            if record.get('semana') is not None:
+                self.by_week.setdefault(record['semana'], []).append(record)
+            if record.get('autor'):
+                self.by_author.setdefault(normalize_name(record['autor']), []).append(record)
+            if record.get('fecha'):
+                self.by_date.setdefault(record['fecha'], []).append(record)
+    
+    @classmethod
+    def from_documents(cls, documents):
+        """Construye el catálogo a partir de la metadata de los documentos (una entrada por archivo)"""
+        records = {}
+        for doc in documents:
+            filename = doc.metadata.get('filename')
+            if filename and filename not in records:
+                records[filename] = {field: doc.metadata.get(field) for field in CATALOG_FIELDS}
+        return cls(list(records.values()))
+    
+    @classmethod
+    def load(cls, persist_dir):
+        """Carga el catálogo guardado junto al vector store, o None si no existe"""
+        catalog_file = os.path.join(persist_dir, CATALOG_FILE)
+        
+        if not os.path.exists(catalog_file):
+            return None
+        
+        with open(catalog_file, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+    
+    def save(self, persist_dir):
+        """Guarda el catálogo junto al vector store"""
+        catalog_file = os.path.join(persist_dir, CATALOG_FILE)
+        tmp_file = catalog_file + '.tmp'
+        
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.records, f, indent=2, ensure_ascii=False)
+        
+        os.replace(tmp_file, catalog_file)
+    
+    def find_author(self, name):
+        """Archivos cuyo autor contiene todas las palabras del nombre buscado"""
+        words = normalize_name(name).split()
+        if not words:
+            return []
+        
+        return [
+            record for author, records in self.by_author.items()
+            if all(word in author.split() for word in words)
+            for record in records
+        ]
+    
+    def lookup(self, semana=None, autor=None, fecha=None, filename=None):
+        """Filtra los archivos del catálogo por cualquier combinación de campos"""
+        if filename is not None:
+            records = [self.by_file[filename]] if filename in self.by_file else []
+        elif semana is not None:
+            records = self.by_week.get(int(semana), [])
+        elif fecha is not None:
+            records = self.by_date.get(fecha, [])
+        else:
+            records = self.records
+        
+        if autor is not None:
+            author_files = {record['filename'] for record in self.find_author(autor)}
+            records = [record for record in records if record['filename'] in author_files]
+        if semana is not None:
+            records = [record for record in records if record.get('semana') == int(semana)]
+        if fecha is not None:
+            records = [record for record in records if record.get('fecha') == fecha]
+        
+        return records
+
+# Solo preguntas que piden quién escribió los apuntes y terminan en la semana; "¿qué dice el autor
+# de la semana 3 sobre X?" es una pregunta de contenido y sigue a la recuperación
+WEEK_AUTHOR_PATTERN = re.compile(
+    r"^\s*¿?\s*(qui[eé]n(es)?|cu[aá]l(es)?)\b.*?\b(escribi|redact|hizo|hicieron|tom[oó]|autor(es|a)?\b)"
+    r".*?\bsemana\s+(?P<semana>\d+)\s*[?.!]*\s*$",
+    re.IGNORECASE
+)
+AUTHOR_NOTES_PATTERN = re.compile(
+    r"(qu[eé]|cu[aá]les)\s+(apuntes|semanas?)\s+(escribi[oó]|redact[oó]|hizo|tom[oó]|le\s+toc[oó]\s+a)\s+(?P<autor>[^?¿.]+)",
+    re.IGNORECASE
+)
+# Solo listados de los apuntes de una fecha; si la pregunta sigue después de la fecha, es de contenido
+DATE_PATTERN = re.compile(
+    r"^\s*¿?\s*((qu[eé]|cu[aá]les)\s+(son\s+los\s+)?apuntes|(mu[eé]strame|lista|dame)\s+(los\s+)?apuntes|apuntes)\b"
+    r"(\s+(hay|existen|son|de|del|el|d[ií]a|con|fecha|tomados|escritos|en))*\s+(?P<fecha>\d{4}-\d{2}-\d{2})\s*[?.!]*\s*$",
+    re.IGNORECASE
+)
+
+def _format_answer(title, records):
+    """Respuesta con la lista de archivos y el bloque de fuentes obligatorio"""
+    lines = [title, ""]
+    for record in records:
+        lines.append(
+            f"- **{record.get('autor', 'N/A')}** — semana {record.get('semana', 'N/A')}, "
+            f"{record.get('fecha', 'N/A')}, parte {record.get('parte', 'N/A')} ({record['filename']})"
+        )
+    
+    lines += ["", "**Fuentes:**"]
+    for record in records:
+        lines.append(f"- Semana {record.get('semana', 'N/A')}, Autor: {record.get('autor', 'N/A')}, Archivo: {record['filename']}")
+    
+    return "\n".join(lines)
+
+def route_metadata_query(question, catalog):
+    """Responde directamente desde el catálogo las consultas de autor/semana/fecha; None si no aplica"""
+    if catalog is None:
+        return None
+    
+    match = WEEK_AUTHOR_PATTERN.search(question)
+    if match:
+        semana = int(match.group('semana'))
+        records = catalog.lookup(semana=semana)
+        if not records:
+            return None
+        return _format_answer(f"Los apuntes de la semana {semana} fueron escritos por:", records)
+    
+    match = AUTHOR_NOTES_PATTERN.search(question)
+    if match:
+        autor = match.group('autor').strip()
+        records = catalog.find_author(autor)
+        if not records:
+            return None
+        return _format_answer(f"Apuntes escritos por {records[0]['autor']}:", records)
+    
+    match = DATE_PATTERN.search(question)
+    if match:
+        records = catalog.lookup(fecha=match.group('fecha'))
+        if not records:
+            return None
+        return _format_answer(f"Apuntes del {match.group('fecha')}:", records)
+    
+    return None
@@ -1,14 +1,44 @@
 from langchain.tools import BaseTool
-from typing import Type
-from pydantic import BaseModel, Field
+from typing import Any, Type, List, Optional
+from pydantic import BaseModel, Field, PrivateAttr
+from collections import OrderedDict
 import os
+import re
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
+from embedding_pipeline import get_embeddings
+from embedding_cache import normalize_text
+from vector_store_io import DEFAULT_PERSIST_DIR, load_vector_store
+from metadata_catalog import MetadataCatalog
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from index_factory import DEFAULT_NPROBE, DEFAULT_EF_SEARCH, set_search_params
+from tracing import trace_span, record_event
+from context_packer import DEFAULT_TOKEN_BUDGET, pack_context
+from compact_index import COMPACT_INDEX_FILE, RERANK_CANDIDATES, TwoStageSearcher
 
 class RAGSearchInput(BaseModel):
     """Input para la herramienta RAG"""
     query: str = Field(description="Consulta para buscar en los apuntes del curso")
     k: int = Field(default=5, description="Número de resultados a devolver")
+    queries: Optional[List[str]] = Field(
+        default=None,
+        description="Consultas adicionales para buscar en la misma llamada (preguntas con varias partes)"
+    )
+    semana: Optional[int] = Field(default=None, description="Limita la búsqueda a los apuntes de esta semana")
+
+SEARCH_MODES = ("vector", "hybrid", "lexical", "auto")
+
+# Consultas que son un identificador exacto: entre comillas, o solo tokens como nombres de archivo
+# o códigos (con dígitos, "_" o "."). Solo estas se responden únicamente con BM25 en modo auto
+QUOTED_QUERY_PATTERN = re.compile(r'^\s*["“«](?P<text>[^"”»]+)["”»]\s*$')
+IDENTIFIER_TOKEN_PATTERN = re.compile(r"^\w*[\d_.]\S*$")
+
+# Pool para sacar la búsqueda en FAISS/BM25 del event loop en la versión asíncrona
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-search")
 
 class RAGSearchTool(BaseTool):
     """Herramienta para buscar en los apuntes del curso usando RAG"""
@@ -24,57 +54,338 @@ class RAGSearchTool(BaseTool):
     - Cualquier tema cubierto en el curso
     """
     vector_store: FAISS = None
+    catalog: Optional[MetadataCatalog] = None
+    bm25: Optional[BM25Index] = None
+    search_mode: str = "hybrid"
+    persist_dir: str = DEFAULT_PERSIST_DIR
+    embeddings: Any = None
+    nprobe: int = DEFAULT_NPROBE
+    ef_search: int = DEFAULT_EF_SEARCH
+    mmap: bool = True
+    query_cache_size: int = 256
+    token_budget: int = DEFAULT_TOKEN_BUDGET
+    # Búsqueda vectorial en el índice compacto con re-ranking exacto; None: si existe compact.faiss
+    two_stage: Optional[bool] = None
+    rerank_candidates: int = RERANK_CANDIDATES
     args_schema: Type[BaseModel] = RAGSearchInput
     
-    def __init__(self):
-        super().__init__()
+    _query_vectors: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _query_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _two_stage_searcher: Any = PrivateAttr(default=None)
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
         self.vector_store = self._load_vector_store()
+        
+        # Parámetros de búsqueda aproximada (sin efecto en índices planos)
+        if self.vector_store:
+            set_search_params(self.vector_store.index, nprobe=self.nprobe, ef_search=self.ef_search)
+            self.catalog = self._load_catalog()
+            self.bm25 = self._load_bm25()
+    
+    def _load_catalog(self):
+        """Carga el catálogo de metadata; si no existe lo arma desde el docstore"""
+        try:
+            catalog = MetadataCatalog.load(self.persist_dir)
+            if catalog is None:
+                catalog = MetadataCatalog.from_documents(self.vector_store.docstore._dict.values())
+            return catalog
+        except Exception as e:
+            print(f"Error loading metadata catalog: {e}")
+            return None
+    
+    def _load_bm25(self):
+        """Carga el índice BM25; si no existe lo construye desde el docstore"""
+        try:
+            bm25 = BM25Index.load(self.persist_dir)
+            return bm25 if bm25 is not None else BM25Index.from_vector_store(self.vector_store)
+        except Exception as e:
+            print(f"Error loading BM25 index: {e}")
+            return None
     
     def _load_vector_store(self):
         """Carga el vector store existente"""
         try:
-            directory = os.path.dirname(os.path.abspath(__file__))
-            persist_dir = os.path.join(directory, "vector_store")
+            persist_dir = self.persist_dir
             
             if not os.path.exists(persist_dir):
                 raise FileNotFoundError("Vector store not found. Please run the RAG setup first.")
             
-            embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-            return FAISS.load_local(persist_dir, embeddings, allow_dangerous_deserialization=True)
+            embeddings = self.embeddings or get_embeddings()
+            
+            if self.mmap:
+                try:
+                    return load_vector_store(persist_dir, embeddings, mmap=True)
+                except Exception as e:
+                    print(f"Memory-mapped load failed ({e}), loading index into RAM")
+            
+            return load_vector_store(persist_dir, embeddings)
         
         except Exception as e:
             print(f"Error loading vector store: {e}")
             return None
     
-    def _run(self, query: str, k: int = 5) -> str:
+    def _get_two_stage_searcher(self):
+        """Buscador en dos etapas, cargado en el primer uso; None si no hay índice compacto válido"""
+        if self._two_stage_searcher is None:
+            with self._query_lock:
+                if self._two_stage_searcher is None:
+                    if self.two_stage is None and not os.path.exists(
+                        os.path.join(self.persist_dir, COMPACT_INDEX_FILE)
+                    ):
+                        self._two_stage_searcher = False
+                        return None
+                    try:
+                        searcher = TwoStageSearcher(self.persist_dir, mmap=self.mmap)
+                        # Las posiciones solo coinciden si se construyó con esta versión del índice principal
+                        if not searcher.is_current() or searcher.ntotal != self.vector_store.index.ntotal:
+                            raise ValueError("compact index is out of date, rebuild the vector store")
+                        self._two_stage_searcher = searcher
+                    except Exception as e:
+                        print(f"Two-stage search unavailable ({e}), using the full index")
+                        self._two_stage_searcher = False
+        
+        return self._two_stage_searcher or None
+    
+    def embedding_cache_stats(self):
+        """Estadísticas de la cache de embeddings usada por las consultas"""
+        cache = getattr(self.vector_store.embedding_function, 'cache', None) if self.vector_store else None
+        return cache.stats() if cache else None
+    
+    def _cached_query_vectors(self, keys):
+        """Vectores presentes en la LRU en memoria y lista de claves faltantes"""
+        vectors = {}
+        
+        with self._query_lock:
+            for key in keys:
+                if key in self._query_vectors:
+                    self._query_vectors.move_to_end(key)
+                    vectors[key] = self._query_vectors[key]
+        
+        return vectors, [key for key in dict.fromkeys(keys) if key not in vectors]
+    
+    def _store_query_vectors(self, vectors, missing, embedded):
+        """Agrega los vectores recién calculados a la LRU"""
+        with self._query_lock:
+            for key, vector in zip(missing, embedded):
+                vectors[key] = np.asarray(vector, dtype=np.float32)
+                self._query_vectors[key] = vectors[key]
+            
+            while len(self._query_vectors) > self.query_cache_size:
+                self._query_vectors.popitem(last=False)
+    
+    def _embed_queries(self, queries):
+        """Embebe las consultas usando la LRU en memoria; las faltantes van en una sola petición"""
+        keys = [normalize_text(query) for query in queries]
+        vectors, missing = self._cached_query_vectors(keys)
+        record_event("query_cache", hits=len(keys) - len(missing), misses=len(missing))
+        
+        if missing:
+            with trace_span("rag.embed", queries=len(missing)):
+                embedded = self.vector_store.embedding_function.embed_documents(missing)
+            self._store_query_vectors(vectors, missing, embedded)
+        
+        return np.vstack([vectors[key] for key in keys])
+    
+    async def _aembed_queries(self, queries):
+        """Versión asíncrona de _embed_queries, con el cliente de embeddings asíncrono"""
+        keys = [normalize_text(query) for query in queries]
+        vectors, missing = self._cached_query_vectors(keys)
+        record_event("query_cache", hits=len(keys) - len(missing), misses=len(missing))
+        
+        if missing:
+            with trace_span("rag.embed", queries=len(missing)):
+                embedded = await self.vector_store.embedding_function.aembed_documents(missing)
+            self._store_query_vectors(vectors, missing, embedded)
+        
+        return np.vstack([vectors[key] for key in keys])
+    
+    def _resolve_mode(self, query, mode):
+        """En modo auto, las consultas entre comillas o de identificadores exactos se responden solo con BM25"""
+        if mode in ("lexical", "auto", "hybrid") and self.bm25 is None:
+            return "vector"
+        if mode == "auto":
+            quoted = QUOTED_QUERY_PATTERN.match(query)
+            if quoted:
+                query = quoted.group('text')
+            exact = quoted or all(IDENTIFIER_TOKEN_PATTERN.match(token) for token in query.split())
+            return "lexical" if exact and self.bm25.has_terms(query) else "hybrid"
+        return mode
+    
+    def _vector_search(self, vectors, k, filenames=None):
+        """Búsqueda vectorial matricial; devuelve [(doc_id, doc, distancia)] por consulta"""
+        if self.vector_store._normalize_L2:
+            faiss.normalize_L2(vectors)
+        
+        # Con filtro por archivo se piden más candidatos y se descartan los de otros archivos
+        fetch_k = min(max(k * 10, 50), self.vector_store.index.ntotal) if filenames is not None else k
+        
+        searcher = self._get_two_stage_searcher() if self.two_stage is not False else None
+        if searcher is not None:
+            scores, indices = searcher.search(vectors, fetch_k, max(self.rerank_candidates, fetch_k * 2))
+        else:
+            scores, indices = self.vector_store.index.search(vectors, fetch_k)
+        
+        results = []
+        for row_scores, row_indices in zip(scores, indices):
+            docs = []
+            for score, position in zip(row_scores, row_indices):
+                if position == -1:
+                    continue
+                doc_id = self.vector_store.index_to_docstore_id[position]
+                doc = self.vector_store.docstore.search(doc_id)
+                if filenames is not None and doc.metadata.get('filename') not in filenames:
+                    continue
+                docs.append((doc_id, doc, float(score)))
+                if len(docs) == k:
+                    break
+            results.append(docs)
+        
+        return results
+    
+    def _lexical_search(self, query, k, filenames=None):
+        """Búsqueda BM25 local; devuelve [(doc_id, doc, score)]"""
+        fetch_k = k * 10 if filenames is not None else k
+        docs = []
+        
+        for doc_id, score in self.bm25.search(query, fetch_k):
+            doc = self.vector_store.docstore.search(doc_id)
+            if filenames is not None and doc.metadata.get('filename') not in filenames:
+                continue
+            docs.append((doc_id, doc, score))
+            if len(docs) == k:
+                break
+        
+        return docs
+    
+    def _plan_search(self, queries, k, mode):
+        """Modo de cada consulta, candidatos a pedir y consultas que necesitan embeddings"""
+        modes = [self._resolve_mode(query, mode or self.search_mode) for query in queries]
+        fetch_k = k if all(m == "vector" for m in modes) else max(k * 4, 20)
+        vector_queries = list(dict.fromkeys(q for q, m in zip(queries, modes) if m != "lexical"))
+        return modes, fetch_k, vector_queries
+    
+    def _combine_results(self, queries, modes, vector_results, k, fetch_k, filenames):
+        """Arma el ranking final de cada consulta según su modo"""
+        results = []
+        for query, query_mode in zip(queries, modes):
+            if query_mode == "vector":
+                ranked = vector_results[query][:k]
+            elif query_mode == "lexical":
+                ranked = self._lexical_search(query, k, filenames)
+            else:
+                lexical = self._lexical_search(query, fetch_k, filenames)
+                docs = {doc_id: doc for doc_id, doc, _ in vector_results[query] + lexical}
+                fused = reciprocal_rank_fusion(
+                    [[doc_id for doc_id, _, _ in vector_results[query]], [doc_id for doc_id, _, _ in lexical]], k
+                )
+                ranked = [(doc_id, docs[doc_id], score) for doc_id, score in fused]
+            
+            results.append([(doc, score) for _, doc, score in ranked])
+        
+        return results
+    
+    def search_batch(self, queries: List[str], k: int = 5, filenames=None, mode: Optional[str] = None):
+        """Busca varias consultas con una sola petición de embeddings y una búsqueda matricial en FAISS"""
+        modes, fetch_k, vector_queries = self._plan_search(queries, k, mode)
+        
+        # Solo las consultas que necesitan vectores pasan por la API de embeddings
+        vector_results = {}
+        if vector_queries:
+            vectors = self._embed_queries(vector_queries)
+            with trace_span("rag.vector_search", queries=len(vector_queries)):
+                vector_results = dict(zip(vector_queries, self._vector_search(vectors, fetch_k, filenames)))
+        
+        with trace_span("rag.rank", modes=sorted(set(modes))):
+            return self._combine_results(queries, modes, vector_results, k, fetch_k, filenames)
+    
+    async def asearch_batch(self, queries: List[str], k: int = 5, filenames=None, mode: Optional[str] = None):
+        """Versión asíncrona de search_batch: embeddings asíncronos y búsqueda en un pool de threads"""
+        loop = asyncio.get_running_loop()
+        modes, fetch_k, vector_queries = self._plan_search(queries, k, mode)
+        
+        vector_results = {}
+        if vector_queries:
+            vectors = await self._aembed_queries(vector_queries)
+            with trace_span("rag.vector_search", queries=len(vector_queries)):
+                rows = await loop.run_in_executor(_search_executor, self._vector_search, vectors, fetch_k, filenames)
+            vector_results = dict(zip(vector_queries, rows))
+        
+        with trace_span("rag.rank", modes=sorted(set(modes))):
+            return await loop.run_in_executor(
+                _search_executor, self._combine_results, queries, modes, vector_results, k, fetch_k, filenames
+            )
+    
+    def _format_results(self, results, token_budget=None, seen=None):
+        """Formatea los resultados de una consulta dentro del presupuesto de tokens"""
+        formatted_results = ""
+        packed = pack_context(results, token_budget or self.token_budget, seen)
+        record_event(
+            "context_pack", chunks=len(results), blocks=len(packed), tokens=sum(tokens for _, tokens in packed)
+        )
+        
+        for i, (block, _) in enumerate(packed, 1):
+            metadata = block.metadata
+            formatted_results += f"**Resultado {i}:**\n"
+            formatted_results += f"- **Semana:** {metadata.get('semana', 'N/A')}\n"
+            formatted_results += f"- **Autor:** {metadata.get('autor', 'N/A')}\n"
+            formatted_results += f"- **Fecha:** {metadata.get('fecha', 'N/A')}\n"
+            formatted_results += f"- **Archivo:** {metadata.get('filename', 'N/A')}\n"
+            formatted_results += f"- **Página:** {metadata.get('page_number', 'N/A')}\n"
+            formatted_results += f"- **Contenido:** {block.text}\n\n"
+        
+        return formatted_results
+    
+    def _week_filenames(self, semana):
+        """Archivos de una semana según el catálogo, o None si no hay filtro"""
+        if semana is None or self.catalog is None:
+            return None
+        return {record['filename'] for record in self.catalog.lookup(semana=semana)}
+    
+    def _format_output(self, all_queries, batch_results):
+        """Formatea los resultados de todas las consultas"""
+        if not any(batch_results):
+            return "No se encontró información relevante en los apuntes del curso."
+        
+        formatted_results = "📚 **Información encontrada en los apuntes:**\n\n"
+        
+        if len(all_queries) == 1:
+            return formatted_results + self._format_results(batch_results[0])
+        
+        # El presupuesto se reparte entre las consultas y un texto ya mostrado no se repite
+        token_budget = self.token_budget // len(all_queries)
+        seen = {}
+        for sub_query, results in zip(all_queries, batch_results):
+            formatted_results += f"🔎 **Consulta:** {sub_query}\n\n"
+            formatted_results += self._format_results(results, token_budget, seen) or "Sin resultados.\n\n"
+        
+        return formatted_results
+    
+    def _run(self, query: str, k: int = 5, queries: Optional[List[str]] = None,
+             semana: Optional[int] = None) -> str:
         """Ejecuta la búsqueda RAG"""
         if not self.vector_store:
             return "Error: No se pudo cargar la base de datos de apuntes."
         
         try:
-            # Realizar búsqueda
-            results = self.vector_store.similarity_search_with_score(query, k=k)
-            
-            if not results:
-                return "No se encontró información relevante en los apuntes del curso."
-            
-            # Formatear resultados
-            formatted_results = "📚 **Información encontrada en los apuntes:**\n\n"
-            
-            for i, (doc, score) in enumerate(results, 1):
-                metadata = doc.metadata
-                formatted_results += f"**Resultado {i}:**\n"
-                formatted_results += f"- **Semana:** {metadata.get('semana', 'N/A')}\n"
-                formatted_results += f"- **Autor:** {metadata.get('autor', 'N/A')}\n"
-                formatted_results += f"- **Fecha:** {metadata.get('fecha', 'N/A')}\n"
-                formatted_results += f"- **Archivo:** {metadata.get('filename', 'N/A')}\n"
-                formatted_results += f"- **Contenido:** {doc.page_content[:300]}...\n\n"
-            
-            return formatted_results
+            # Realizar búsqueda (todas las consultas en una sola ronda)
+            all_queries = list(dict.fromkeys([query] + (queries or [])))
+            batch_results = self.search_batch(all_queries, k=k, filenames=self._week_filenames(semana))
+            return self._format_output(all_queries, batch_results)
             
         except Exception as e:
             return f"Error al buscar en los apuntes: {str(e)}"
     
-    async def _arun(self, query: str, k: int = 5) -> str:
-        """Versión asíncrona"""
-        return self._run(query, k)
\ No newline at end of file
+    async def _arun(self, query: str, k: int = 5, queries: Optional[List[str]] = None,
+                    semana: Optional[int] = None) -> str:
+        """Versión asíncrona: no bloquea el event loop durante embeddings ni búsqueda"""
+        if not self.vector_store:
+            return "Error: No se pudo cargar la base de datos de apuntes."
+        
+        try:
+            all_queries = list(dict.fromkeys([query] + (queries or [])))
+            batch_results = await self.asearch_batch(all_queries, k=k, filenames=self._week_filenames(semana))
+            return self._format_output(all_queries, batch_results)
+            
+        except Exception as e:
+            return f"Error al buscar en los apuntes: {str(e)}"
@@ -1,7 +1,100 @@
 from langchain.tools import BaseTool
 from typing import Type
-from pydantic import BaseModel, Field
-import wikipedia
+from pydantic import BaseModel, Field, PrivateAttr
+import os
+import time
+import threading
+import asyncio
+import contextvars
+import httpx
+from concurrent.futures import ThreadPoolExecutor, wait
+from wikipedia_cache import WikipediaCache
+from tracing import trace_span, record_event
+
+API_URL = "https://{language}.wikipedia.org/w/api.php"
+HEADERS = {"User-Agent": "IA-Tarea3/0.1 (asistente del curso de Inteligencia Artificial)"}
+WIKIPEDIA_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "wikipedia.sqlite")
+
+# Revalidación en segundo plano de entradas vencidas (stale-while-revalidate)
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="wikipedia-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def _search_params(query, max_results):
+    """Parámetros de la API de MediaWiki para buscar títulos"""
+    return {
+        "action": "query",
+        "list": "search",
+        "srsearch": query,
+        "srlimit": max_results,
+        "srprop": "",
+        "format": "json"
+    }
+
+def _page_params(title):
+    """Parámetros para traer resumen, URL y marca de desambiguación de una página en una sola petición"""
+    return {
+        "action": "query",
+        "prop": "extracts|info|pageprops",
+        "exintro": 1,
+        "explaintext": 1,
+        "exsentences": 2,
+        "inprop": "url",
+        "ppprop": "disambiguation",
+        "redirects": 1,
+        "titles": title,
+        "format": "json"
+    }
+
+def _links_params(title):
+    """Parámetros para traer los enlaces de una página (en orden de aparición)"""
+    return {
+        "action": "parse",
+        "page": title,
+        "prop": "links",
+        "redirects": 1,
+        "format": "json"
+    }
+
+def _parse_search(data):
+    """Títulos de los resultados de búsqueda"""
+    return [result["title"] for result in data.get("query", {}).get("search", [])]
+
+def _parse_page(data):
+    """Extrae título, resumen y URL; None si la página no existe. Las de desambiguación se marcan"""
+    pages = data.get("query", {}).get("pages", {})
+    if not pages:
+        return None
+    
+    page = next(iter(pages.values()))
+    if "missing" in page:
+        return None
+    if "disambiguation" in page.get("pageprops", {}):
+        return {"title": page["title"], "disambiguation": True}
+    
+    return {"title": page["title"], "summary": page.get("extract", ""), "url": page.get("fullurl", "")}
+
+def _parse_first_option(data):
+    """Primer artículo existente enlazado desde una página de desambiguación, o None"""
+    for link in data.get("parse", {}).get("links", []):
+        if link.get("ns") == 0 and "exists" in link:
+            return link["*"]
+    return None
+
+def _resolved(page):
+    """Página lista para mostrar ({} si no existe o sigue siendo de desambiguación)"""
+    return page if page and not page.get("disambiguation") else {}
+
+def _format_pages(pages):
+    """Formatea las páginas encontradas"""
+    formatted_results = "**Información de Wikipedia:**\n\n"
+    
+    for i, page in enumerate(pages, 1):
+        formatted_results += f"**{i}. {page['title']}**\n"
+        formatted_results += f"Resumen: {page['summary']}\n"
+        formatted_results += f"Leer más: {page['url']}\n\n"
+    
+    return formatted_results
 
 class WikipediaSearchInput(BaseModel):
     """Input para la herramienta Wikipedia"""
@@ -22,49 +115,196 @@ class WikipediaSearchTool(BaseTool):
     Solo usar cuando se solicite explícitamente buscar información externa.
     """
     args_schema: Type[BaseModel] = WikipediaSearchInput
+    language: str = "es"
+    timeout: float = 5.0
+    deadline: float = 8.0
+    max_workers: int = 4
+    use_cache: bool = True
+    cache_ttl: float = 7 * 24 * 3600
+    
+    _client: httpx.Client = PrivateAttr(default=None)
+    _cache: WikipediaCache = PrivateAttr(default=None)
     
-    def __init__(self, language: str = "es"):
-        super().__init__()
-        wikipedia.set_lang(language)
+    def __init__(self, language: str = "es", **kwargs):
+        super().__init__(language=language, **kwargs)
+        # Cliente compartido: reutiliza conexiones entre peticiones
+        self._client = httpx.Client(timeout=self.timeout, headers=HEADERS)
+        
+        if self.use_cache:
+            self._cache = WikipediaCache(WIKIPEDIA_CACHE_PATH, ttl=self.cache_ttl)
+    
+    def _cache_lookup(self, kind, key, refresh):
+        """Valor cacheado o None; si está vencido se sirve igual y se revalida en segundo plano"""
+        if self._cache is None:
+            return None
+        
+        value, fresh = self._cache.get(self.language, kind, key)
+        record_event("wikipedia_cache", kind=kind, status="miss" if value is None else "fresh" if fresh else "stale")
+        
+        if value is not None and not fresh:
+            refresh_key = (self.language, kind, key)
+            with _refreshing_lock:
+                if refresh_key in _refreshing:
+                    return value
+                _refreshing.add(refresh_key)
+            
+            def revalidate():
+                try:
+                    self._cache_put(kind, key, refresh())
+                except Exception:
+                    pass  # Sin red: se sigue sirviendo la versión vencida
+                finally:
+                    with _refreshing_lock:
+                        _refreshing.discard(refresh_key)
+            
+            _refresh_executor.submit(revalidate)
+        
+        return value
+    
+    def _cache_put(self, kind, key, value):
+        if self._cache is not None:
+            self._cache.put(self.language, kind, key, value)
+    
+    def _cached(self, kind, key, fetch):
+        """Devuelve el valor de la cache o lo pide a Wikipedia y lo guarda"""
+        value = self._cache_lookup(kind, key, fetch)
+        if value is None:
+            value = fetch()
+            self._cache_put(kind, key, value)
+        return value
+    
+    def _search_titles(self, query, max_results):
+        """Títulos de Wikipedia que coinciden con la consulta"""
+        with trace_span("wikipedia.search"):
+            response = self._client.get(self.api_url, params=_search_params(query, max_results))
+        response.raise_for_status()
+        return _parse_search(response.json())
+    
+    @property
+    def api_url(self):
+        return API_URL.format(language=self.language)
+    
+    def _get_page(self, title):
+        with trace_span("wikipedia.page", title=title):
+            response = self._client.get(self.api_url, params=_page_params(title))
+        response.raise_for_status()
+        return _parse_page(response.json())
+    
+    def _fetch_page(self, title):
+        """Trae resumen y URL de una página ({} si no sirve); si es de desambiguación, la primera opción"""
+        page = self._get_page(title)
+        if page and page.get("disambiguation"):
+            with trace_span("wikipedia.disambiguation", title=title):
+                response = self._client.get(self.api_url, params=_links_params(page["title"]))
+            response.raise_for_status()
+            option = _parse_first_option(response.json())
+            page = self._get_page(option) if option else None
+        return _resolved(page)
+    
+    def _cached_page(self, title):
+        return self._cached("page", title, lambda: self._fetch_page(title))
     
     def _run(self, query: str, max_results: int = 3) -> str:
         """Ejecuta la búsqueda en Wikipedia"""
+        start = time.monotonic()
+        
         try:
             # Buscar páginas
-            search_results = wikipedia.search(query, results=max_results)
+            titles = self._cached(
+                "search", f"{max_results}:{query}", lambda: self._search_titles(query, max_results)
+            )
             
-            if not search_results:
+            if not titles:
                 return "No se encontraron resultados en Wikipedia."
             
-            formatted_results = "**Información de Wikipedia:**\n\n"
+            # Una petición por título, en paralelo; al vencer el plazo se devuelve lo que haya llegado
+            executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(titles)))
+            # Cada tarea lleva una copia del contexto para que sus spans lleguen a la traza en curso
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._cached_page, title) for title in titles
+            ]
+            wait(futures, timeout=max(0.0, self.deadline - (time.monotonic() - start)))
+            executor.shutdown(wait=False, cancel_futures=True)
             
-            for i, title in enumerate(search_results, 1):
-                try:
-                    summary = wikipedia.summary(title, sentences=2)
-                    page = wikipedia.page(title)
-                    
-                    formatted_results += f"**{i}. {title}**\n"
-                    formatted_results += f"Resumen: {summary}\n"
-                    formatted_results += f"Leer más: {page.url}\n\n"
-                    
-                except wikipedia.exceptions.DisambiguationError as e:
-                    # Tomar la primera opción si hay ambigüedad
-                    try:
-                        summary = wikipedia.summary(e.options[0], sentences=2)
-                        page = wikipedia.page(e.options[0])
-                        formatted_results += f"**{i}. {e.options[0]}**\n"
-                        formatted_results += f"Resumen: {summary}\n"
-                        formatted_results += f"Leer más: {page.url}\n\n"
-                    except:
-                        continue
-                except:
-                    continue
+            pages = [
+                future.result() for future in futures
+                if future.done() and not future.cancelled() and future.exception() is None
+            ]
+            pages = [page for page in pages if page]
+            
+            if not pages:
+                return "No se pudo obtener información de Wikipedia a tiempo."
             
-            return formatted_results
+            return _format_pages(pages)
             
         except Exception as e:
             return f"Error al buscar en Wikipedia: {str(e)}"
     
+    async def _aget_page(self, client, title):
+        with trace_span("wikipedia.page", title=title):
+            response = await client.get(self.api_url, params=_page_params(title))
+        response.raise_for_status()
+        return _parse_page(response.json())
+    
+    async def _afetch_page(self, client, title):
+        """Trae una página con HTTP asíncrono, pasando por la cache (desambiguación: primera opción)"""
+        # SQLite es bloqueante: la cache se consulta en un hilo para no frenar el event loop
+        page = await asyncio.to_thread(self._cache_lookup, "page", title, lambda: self._fetch_page(title))
+        if page is not None:
+            return page
+        
+        page = await self._aget_page(client, title)
+        if page and page.get("disambiguation"):
+            with trace_span("wikipedia.disambiguation", title=title):
+                response = await client.get(self.api_url, params=_links_params(page["title"]))
+            response.raise_for_status()
+            option = _parse_first_option(response.json())
+            page = await self._aget_page(client, option) if option else None
+        
+        page = _resolved(page)
+        await asyncio.to_thread(self._cache_put, "page", title, page)
+        return page
+    
     async def _arun(self, query: str, max_results: int = 3) -> str:
-        """Versión asíncrona"""
-        return self._run(query, max_results)
\ No newline at end of file
+        """Versión asíncrona: HTTP asíncrono y páginas pedidas en paralelo"""
+        start = time.monotonic()
+        
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout, headers=HEADERS) as client:
+                search_key = f"{max_results}:{query}"
+                titles = await asyncio.to_thread(
+                    self._cache_lookup, "search", search_key, lambda: self._search_titles(query, max_results)
+                )
+                
+                if titles is None:
+                    with trace_span("wikipedia.search"):
+                        response = await client.get(self.api_url, params=_search_params(query, max_results))
+                    response.raise_for_status()
+                    titles = _parse_search(response.json())
+                    await asyncio.to_thread(self._cache_put, "search", search_key, titles)
+                
+                if not titles:
+                    return "No se encontraron resultados en Wikipedia."
+                
+                tasks = [asyncio.create_task(self._afetch_page(client, title)) for title in titles]
+                await asyncio.wait(tasks, timeout=max(0.0, self.deadline - (time.monotonic() - start)))
+                
+                # Al vencer el plazo se cancelan las peticiones pendientes (antes de cerrar el cliente)
+                pending = [task for task in tasks if not task.done()]
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            
+            pages = [
+                task.result() for task in tasks
+                if task.done() and not task.cancelled() and task.exception() is None
+            ]
+            pages = [page for page in pages if page]
+            
+            if not pages:
+                return "No se pudo obtener información de Wikipedia a tiempo."
+            
+            return _format_pages(pages)
+            
+        except Exception as e:
+            return f"Error al buscar en Wikipedia: {str(e)}"
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import shutil
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Apuntadores")
+EMBEDDING_DIM = 32
+CORPUS_SIZE = 8
+
+class HashEmbeddings(Embeddings):
+    """Embeddings locales y deterministas (hash del texto): los tests no llaman a la API"""
+    
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+    
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+    
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text):
+        return self._embed(text)
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory):
+    """Copia única por sesión de los primeros PDFs de los apuntes"""
+    corpus_dir = tmp_path_factory.mktemp("corpus")
+    pdfs = sorted(fn for fn in os.listdir(PDF_DIR) if fn.endswith('.pdf'))[:CORPUS_SIZE]
+    for fn in pdfs:
+        shutil.copyfile(os.path.join(PDF_DIR, fn), corpus_dir / fn)
+    return corpus_dir, pdfs
+
+@pytest.fixture
+def embeddings():
+    return HashEmbeddings()
+
+@pytest.fixture
+def build_store(corpus, tmp_path, embeddings):
+    """Crea un vector store con los primeros n_pdfs PDFs del corpus en un directorio temporal
+
+    Devuelve (vector_store, pdf_dir, persist_dir, pdfs); pdf_dir es propio del test y se puede modificar.
+    """
+    from vector_creation_and_test import create_vector_store
+    
+    corpus_dir, all_pdfs = corpus
+    
+    def build(n_pdfs=3, **kwargs):
+        pdf_dir = tmp_path / "pdfs"
+        pdf_dir.mkdir(exist_ok=True)
+        pdfs = all_pdfs[:n_pdfs]
+        for fn in pdfs:
+            if not (pdf_dir / fn).exists():
+                os.symlink(corpus_dir / fn, pdf_dir / fn)
+        
+        persist_dir = str(tmp_path / "vector_store")
+        kwargs.setdefault('embeddings', embeddings)
+        vector_store = create_vector_store(str(pdf_dir), persist_dir, **kwargs)
+        return vector_store, pdf_dir, persist_dir, pdfs
+    
+    return build
@@ -0,0 +1,51 @@
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+from agent import ERROR_PREFIX, AIAssistant
+from tracing import Tracer
+
+@tool
+def rag_search(query: str) -> str:
+    """Busca en los apuntes"""
+    return "Contexto de prueba"
+
+def failing_llm(_):
+    raise RuntimeError("el LLM no responde")
+
+class FakeResources:
+    """Recursos mínimos: sin catálogo ni cache, con un LLM que falla"""
+    tracer = Tracer(enabled=False)
+    catalog = None
+    answer_cache = None
+    rag_tool = rag_search
+    rag_tool_loaded = True
+
+    @property
+    def llm(self):
+        return RunnableLambda(failing_llm)
+
+class BrokenResources(FakeResources):
+    """El LLM ni siquiera se puede crear (p. ej. sin OPENAI_API_KEY)"""
+    @property
+    def llm(self):
+        raise RuntimeError("falta OPENAI_API_KEY")
+
+    @property
+    def catalog(self):
+        raise RuntimeError("falta OPENAI_API_KEY")
+
+def test_stream_chat_reports_failing_llm():
+    assistant = AIAssistant(resources=FakeResources(), use_answer_cache=False, mode="direct")
+
+    events = list(assistant.stream_chat("¿Qué es un puntero?"))
+
+    assert events[-1]["type"] == "error"
+    assert events[-1]["message"].startswith(ERROR_PREFIX)
+    assert "el LLM no responde" in events[-1]["message"]
+
+def test_stream_chat_reports_errors_outside_the_stream():
+    assistant = AIAssistant(resources=BrokenResources(), use_answer_cache=False, mode="direct")
+
+    events = list(assistant.stream_chat("¿Qué es un puntero?"))
+
+    assert events == [{"type": "error", "message": f"{ERROR_PREFIX}: falta OPENAI_API_KEY"}]
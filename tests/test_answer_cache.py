@@ -0,0 +1,37 @@
+import asyncio
+
+from answer_cache import SemanticAnswerCache
+
+class ConstantEmbeddings:
+    """Embeddings que hacen a todas las preguntas idénticas por coseno"""
+    
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+class AsyncOnlyEmbeddings:
+    """Falla si se usa el embed_query síncrono (bloquearía el event loop)"""
+    
+    def embed_query(self, text):
+        raise AssertionError("embed_query síncrono llamado desde el camino asíncrono")
+    
+    async def aembed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+def test_questions_differing_in_a_number_do_not_collide():
+    cache = SemanticAnswerCache(ConstantEmbeddings())
+    answer, vector = cache.lookup("resumen de la semana 4")
+    cache.store(vector, "respuesta semana 4", "resumen de la semana 4")
+    
+    assert cache.lookup("resumen de la semana 3")[0] is None
+    assert cache.lookup("resumen de la semana 4")[0] == "respuesta semana 4"
+    assert cache.lookup("¿me das un resumen de la semana 4?")[0] == "respuesta semana 4"
+
+def test_alookup_uses_async_embeddings():
+    cache = SemanticAnswerCache(AsyncOnlyEmbeddings())
+    
+    async def run():
+        answer, vector = await cache.alookup("¿Qué es backpropagation?")
+        cache.store(vector, "respuesta", "¿Qué es backpropagation?")
+        return answer, (await cache.alookup("¿Qué es backpropagation?"))[0]
+    
+    assert asyncio.run(run()) == (None, "respuesta")
@@ -0,0 +1,48 @@
+import json
+
+from batch_runner import BatchRunner, compact_output, completed_ids
+
+def write_lines(path, lines):
+    path.write_text("".join(lines), encoding='utf-8')
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+def test_compact_output_keeps_one_record_per_id(tmp_path):
+    output = tmp_path / "out.jsonl"
+    write_lines(output, [
+        json.dumps({'id': '1', 'answer': 'a'}) + "\n",
+        json.dumps({'id': '2', 'answer': 'x', 'error': 'x'}) + "\n",
+        json.dumps({'id': '1', 'answer': 'a2'}) + "\n",
+        json.dumps({'id': '2', 'answer': 'b'}) + "\n",
+        json.dumps({'id': '1', 'answer': 'y', 'error': 'y'}) + "\n",
+        '{"id": "3", "ans',
+    ])
+    
+    assert compact_output(str(output)) == 4
+    assert read_records(output) == [{'id': '1', 'answer': 'a2'}, {'id': '2', 'answer': 'b'}]
+    assert completed_ids(str(output)) == {'1', '2'}
+
+def test_resume_after_partial_write_has_no_duplicates(tmp_path):
+    output = tmp_path / "out.jsonl"
+    write_lines(output, [
+        json.dumps({'id': '1', 'answer': 'a'}) + "\n",
+        json.dumps({'id': '2', 'answer': 'x', 'error': 'x'}) + "\n",
+        '{"id": "3", "ans',
+    ])
+    
+    runner = BatchRunner(str(output), workers=2, rate=0)
+    answered = []
+    
+    def fake_answer(question_id, question):
+        answered.append(question_id)
+        record = {'id': question_id, 'answer': question.upper(), 'timings': {'wall_ms': 1.0}}
+        runner._write(record)
+        return record
+    
+    runner._answer = fake_answer
+    runner.run([('1', 'uno'), ('2', 'dos'), ('3', 'tres')])
+    
+    assert sorted(answered) == ['2', '3']
+    ids = [record['id'] for record in read_records(output)]
+    assert sorted(ids) == ['1', '2', '3']
@@ -0,0 +1,33 @@
+import pytest
+
+from compact_index import compact_index_is_current
+from rag_tool import RAGSearchTool
+from vector_creation_and_test import create_vector_store
+
+@pytest.fixture
+def store(build_store):
+    vector_store, pdf_dir, persist_dir, _ = build_store(3, compact_dim=16)
+    return vector_store, pdf_dir, persist_dir
+
+def test_two_stage_enabled_when_compact_index_exists(store, embeddings):
+    _, _, persist_dir = store
+    tool = RAGSearchTool(persist_dir=persist_dir, embeddings=embeddings)
+    
+    assert tool.two_stage is None
+    assert tool._get_two_stage_searcher() is not None
+    assert tool._run("backpropagation").strip()
+
+def test_stale_compact_index_is_not_used(store, embeddings):
+    vector_store, pdf_dir, persist_dir = store
+    assert compact_index_is_current(persist_dir)
+    
+    # El índice principal cambia (mismo número de vectores) sin regenerar el compacto
+    vector_store.save_local(persist_dir)
+    assert not compact_index_is_current(persist_dir)
+    
+    tool = RAGSearchTool(persist_dir=persist_dir, embeddings=embeddings)
+    assert tool._get_two_stage_searcher() is None
+    
+    # Una actualización del vector store regenera el compacto
+    create_vector_store(str(pdf_dir), persist_dir, embeddings=embeddings)
+    assert compact_index_is_current(persist_dir)
@@ -0,0 +1,45 @@
+from langchain_core.documents import Document
+
+from context_packer import pack_context
+
+FIRST = "Un puntero guarda la dirección de memoria de otra variable del programa."
+SECOND = "de otra variable del programa. Con el operador * se accede al valor apuntado."
+THIRD = "Antes de usarlo hay que inicializarlo."
+
+def doc(text, page=1):
+    return Document(page_content=text, metadata={'filename': "apuntes.pdf", 'page': page})
+
+def texts(packed):
+    return [block.text for block, _ in packed]
+
+def test_partial_overlap_across_sub_queries_is_trimmed():
+    seen = {}
+    assert texts(pack_context([(doc(FIRST), 0.9)], seen=seen)) == [FIRST]
+
+    # Solo se muestra lo que la primera subconsulta no mostró
+    assert texts(pack_context([(doc(SECOND), 0.8)], seen=seen)) == [
+        "Con el operador * se accede al valor apuntado."
+    ]
+
+def test_superset_keeps_only_new_text():
+    seen = {}
+    pack_context([(doc(SECOND), 0.9)], seen=seen)
+
+    superset = f"{FIRST.split(' de otra')[0]} {SECOND} {THIRD}"
+    assert texts(pack_context([(doc(superset), 0.8)], seen=seen)) == [
+        "Un puntero guarda la dirección de memoria ... Antes de usarlo hay que inicializarlo."
+    ]
+
+def test_text_covered_by_accumulated_spans_is_dropped():
+    seen = {}
+    pack_context([(doc(FIRST), 0.9)], seen=seen)
+    pack_context([(doc(SECOND), 0.9)], seen=seen)
+
+    # Está repartido entre las dos subconsultas anteriores, no dentro de una sola
+    middle = "variable del programa. Con el operador *"
+    assert pack_context([(doc(middle), 0.7)], seen=seen) == []
+
+def test_other_pages_are_not_deduplicated():
+    seen = {}
+    pack_context([(doc(FIRST), 0.9)], seen=seen)
+    assert texts(pack_context([(doc(FIRST, page=2), 0.9)], seen=seen)) == [FIRST]
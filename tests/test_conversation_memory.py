@@ -0,0 +1,26 @@
+from langchain_core.messages import AIMessage
+
+from conversation_memory import TokenBudgetMemory
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = 0
+    
+    def invoke(self, prompt):
+        self.calls += 1
+        return AIMessage(content=f"resumen {self.calls}")
+
+def test_summarized_messages_are_pruned():
+    memory = TokenBudgetMemory(llm=FakeLLM(), return_messages=True, max_tokens=60)
+    answer = "La función sigmoide aplasta la entrada al rango entre cero y uno. " * 3
+    
+    for turn in range(20):
+        memory.save_context({"input": f"pregunta {turn}"}, {"output": answer})
+        memory.wait_for_summary(timeout=5)
+    
+    assert memory.summary.startswith("resumen")
+    assert len(memory.chat_memory.messages) <= 4
+    assert memory.chat_memory.messages[-1].content == answer
+    
+    history = memory.load_memory_variables({})["chat_history"]
+    assert "resumen" in history[0].content
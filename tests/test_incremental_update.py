@@ -0,0 +1,57 @@
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from index_factory import create_index, index_precision, supports_removal
+from vector_creation_and_test import create_vector_store
+
+DIM = 32
+
+@pytest.mark.parametrize("index_type, precision, expected", [
+    ("flat", "float32", True),
+    ("flat", "int8", True),
+    ("hnsw", "float32", False),
+    ("ivf", "float32", False),
+    ("ivf", "int8", False),
+    ("ivfpq", "float32", False),
+])
+def test_supports_removal(index_type, precision, expected):
+    vectors = np.random.default_rng(0).standard_normal((2000, DIM)).astype(np.float32)
+    index = create_index(index_type, DIM, training_vectors=vectors, precision=precision)
+    assert supports_removal(index) is expected
+
+def test_ivf_store_searchable_after_removing_pdfs(build_store):
+    """Borrar PDFs de un índice IVF reconstruye el índice en vez de desalinear el docstore"""
+    vector_store, pdf_dir, persist_dir, pdfs = build_store(8, index_type="ivf")
+    assert faiss.try_extract_index_ivf(vector_store.index) is not None
+    
+    for fn in pdfs[: len(pdfs) // 2]:
+        os.remove(pdf_dir / fn)
+    vector_store = create_vector_store(
+        str(pdf_dir), persist_dir, index_type="ivf", embeddings=vector_store.embedding_function
+    )
+    
+    assert vector_store.index.ntotal == len(vector_store.index_to_docstore_id)
+    results = vector_store.similarity_search("backpropagation", k=vector_store.index.ntotal)
+    assert {doc.metadata['filename'] for doc in results} <= set(pdfs[len(pdfs) // 2:])
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_float16_index_without_training_vectors(index_type):
+    index = create_index(index_type, DIM, precision="float16")
+    assert index_precision(index) == "float16"
+    
+    vectors = np.random.default_rng(1).standard_normal((10, DIM)).astype(np.float32)
+    index.add(vectors)
+    assert index.search(vectors[:1], 1)[1][0][0] == 0
+
+def test_precision_mismatch_rebuilds(build_store, tmp_path, embeddings):
+    _, pdf_dir, persist_dir, _ = build_store(2, precision="float16")
+    
+    # Índice guardado en float32 con un manifiesto que dice float16
+    stale = create_vector_store(str(pdf_dir), str(tmp_path / "other"), embeddings=embeddings)
+    faiss.write_index(stale.index, os.path.join(persist_dir, "index.faiss"))
+    
+    vector_store = create_vector_store(str(pdf_dir), persist_dir, embeddings=embeddings, precision="float16")
+    assert index_precision(vector_store.index) == "float16"
@@ -0,0 +1,48 @@
+import pytest
+
+from metadata_catalog import MetadataCatalog, route_metadata_query
+from vector_creation_and_test import create_vector_store, load_manifest, save_manifest
+
+CATALOG = MetadataCatalog([
+    {'filename': '3_SEMANA_AI_1.pdf', 'semana': 3, 'autor': 'Ana Mora', 'fecha': '2025-03-04', 'parte': 1},
+])
+
+@pytest.mark.parametrize("question", [
+    "¿Quién escribió los apuntes de la semana 3?",
+    "¿Quiénes son los autores de la semana 3?",
+    "¿Cuál es el autor de la semana 3?",
+])
+def test_author_questions_use_catalog(question):
+    assert "Ana Mora" in route_metadata_query(question, CATALOG)
+
+@pytest.mark.parametrize("question", [
+    "¿Qué apuntes hay del 2025-03-04?",
+    "Muéstrame los apuntes del 2025-03-04",
+])
+def test_date_listing_questions_use_catalog(question):
+    assert "3_SEMANA_AI_1.pdf" in route_metadata_query(question, CATALOG)
+
+@pytest.mark.parametrize("question", [
+    "¿Qué dice el autor de la semana 3 sobre backpropagation?",
+    "¿Qué explican los apuntes del 2025-03-04 sobre regresión logística?",
+    "Apuntes sobre regresión logística del 2025-03-04",
+    "¿Quién escribió la semana 3 sobre backpropagation?",
+    "Resumen de la semana 3",
+])
+def test_content_questions_fall_through(question):
+    assert route_metadata_query(question, CATALOG) is None
+
+def test_catalog_rebuilt_for_manifest_without_metadata(build_store, embeddings):
+    _, pdf_dir, persist_dir, pdfs = build_store(3)
+    
+    # Manifiesto escrito antes de que las entradas guardaran la metadata
+    manifest = load_manifest(persist_dir)
+    for entry in manifest['files'].values():
+        del entry['metadata']
+    save_manifest(persist_dir, manifest)
+    MetadataCatalog([]).save(persist_dir)
+    
+    create_vector_store(str(pdf_dir), persist_dir, embeddings=embeddings)
+    
+    assert sorted(record['filename'] for record in MetadataCatalog.load(persist_dir).records) == pdfs
+    assert all('metadata' in entry for entry in load_manifest(persist_dir)['files'].values())
@@ -0,0 +1,27 @@
+import pytest
+
+from bm25_index import BM25Index
+from rag_tool import RAGSearchTool
+
+@pytest.fixture
+def tool(tmp_path):
+    tool = RAGSearchTool(persist_dir=str(tmp_path), embeddings=object())
+    tool.bm25 = BM25Index()
+    tool.bm25.build(["a", "b"], [
+        "redes neuronales convolucionales y backpropagation",
+        "proyecto II en 3_SEMANA_AI_250304_1.pdf con pytorch",
+    ])
+    return tool
+
+def test_default_mode_is_hybrid(tool):
+    assert tool.search_mode == "hybrid"
+
+@pytest.mark.parametrize("query, expected", [
+    ("redes neuronales convolucionales", "hybrid"),
+    ("backpropagation", "hybrid"),
+    ('"redes neuronales"', "lexical"),
+    ("3_SEMANA_AI_250304_1.pdf", "lexical"),
+    ("ecuaciones de Bellman", "hybrid"),
+])
+def test_auto_sends_only_exact_queries_to_bm25(tool, query, expected):
+    assert tool._resolve_mode(query, "auto") == expected
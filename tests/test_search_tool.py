@@ -0,0 +1,58 @@
+import asyncio
+import functools
+
+import httpx
+
+import search_tool
+from search_tool import WikipediaSearchTool
+
+PAGES = {
+    "Mercurio": {"pageprops": {"disambiguation": ""}},
+    "Mercurio (planeta)": {"extract": "Planeta más cercano al Sol.", "fullurl": "https://es.wikipedia.org/wiki/Mercurio_(planeta)"},
+    "Lento": {"extract": "Nunca llega.", "fullurl": "https://es.wikipedia.org/wiki/Lento"},
+}
+
+def handler(request, search_titles):
+    params = dict(request.url.params)
+    if params.get("list") == "search":
+        return httpx.Response(200, json={"query": {"search": [{"title": t} for t in search_titles]}})
+    if params.get("action") == "parse":
+        links = [{"ns": 14, "exists": "", "*": "Categoría:Desambiguación"}, {"ns": 0, "exists": "", "*": "Mercurio (planeta)"}]
+        return httpx.Response(200, json={"parse": {"links": links}})
+    
+    title = params["titles"]
+    return httpx.Response(200, json={"query": {"pages": {"1": {"title": title, **PAGES[title]}}}})
+
+def make_tool(search_titles, **kwargs):
+    tool = WikipediaSearchTool(use_cache=False, **kwargs)
+    tool._client = httpx.Client(transport=httpx.MockTransport(functools.partial(handler, search_titles=search_titles)))
+    return tool
+
+def test_disambiguation_takes_first_option():
+    result = make_tool(["Mercurio"])._run("mercurio")
+    assert "Mercurio (planeta)" in result and "Planeta más cercano" in result
+
+def test_disambiguation_takes_first_option_async(monkeypatch):
+    transport = httpx.MockTransport(functools.partial(handler, search_titles=["Mercurio"]))
+    monkeypatch.setattr(search_tool.httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=transport))
+    
+    result = asyncio.run(make_tool(["Mercurio"])._arun("mercurio"))
+    assert "Mercurio (planeta)" in result
+
+def test_deadline_cancels_pending_pages(monkeypatch):
+    cancelled = []
+    tool = make_tool(["Lento"], deadline=0.05)
+    
+    async def slow_page(client, title):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(title)
+            raise
+    
+    transport = httpx.MockTransport(functools.partial(handler, search_titles=["Lento"]))
+    monkeypatch.setattr(search_tool.httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=transport))
+    object.__setattr__(tool, "_afetch_page", slow_page)
+    
+    assert asyncio.run(tool._arun("lento")) == "No se pudo obtener información de Wikipedia a tiempo."
+    assert cancelled == ["Lento"]
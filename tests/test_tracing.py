@@ -0,0 +1,45 @@
+from tracing import RERUN_TRACE, Tracer, load_traces, summarize_traces
+
+def test_load_traces_reads_the_tail_across_rotation(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    tracer = Tracer(path, max_bytes=2000)
+    
+    for i in range(60):
+        with tracer.request("chat", i=i):
+            pass
+    
+    assert (tmp_path / "traces.jsonl.1").exists()
+    assert (tmp_path / "traces.jsonl").stat().st_size <= 2000 + 200
+    
+    traces = load_traces(path, last_n=15)
+    assert [trace['attributes']['i'] for trace in traces] == list(range(45, 60))
+
+def test_load_traces_missing_file(tmp_path):
+    assert load_traces(str(tmp_path / "missing.jsonl")) == []
+
+def test_summary_reports_reruns_apart_from_requests(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    tracer = Tracer(path)
+    
+    with tracer.request("chat"):
+        pass
+    for _ in range(3):
+        with tracer.request(RERUN_TRACE):
+            pass
+    
+    summary = summarize_traces(load_traces(path))
+    rows = {row['span']: row['count'] for row in summary['spans']}
+    assert summary['requests'] == 1
+    assert summary['reruns'] == 3
+    assert rows == {"request.chat": 1, f"request.{RERUN_TRACE}": 3}
+
+def test_callbacks_record_llm_spans(tmp_path):
+    from langchain_core.language_models import FakeListChatModel
+    
+    path = str(tmp_path / "traces.jsonl")
+    tracer = Tracer(path)
+    
+    with tracer.request("chat") as trace:
+        FakeListChatModel(responses=["hola"]).invoke("hola", config={"callbacks": tracer.callbacks(trace)})
+    
+    assert [span['name'] for span in load_traces(path)[0]['spans']] == ["llm"]
@@ -0,0 +1,102 @@
+import asyncio
+import functools
+import time
+
+import httpx
+
+import search_tool
+import wikipedia_cache
+from search_tool import WikipediaSearchTool
+from wikipedia_cache import WikipediaCache
+
+PAGE = {"extract": "Planeta más cercano al Sol.", "fullurl": "https://es.wikipedia.org/wiki/Mercurio_(planeta)"}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+def online(request, extract):
+    params = dict(request.url.params)
+    if params.get("list") == "search":
+        return httpx.Response(200, json={"query": {"search": [{"title": "Mercurio (planeta)"}]}})
+    page = {"title": params["titles"], **PAGE, "extract": extract}
+    return httpx.Response(200, json={"query": {"pages": {"1": page}}})
+
+def offline(request):
+    raise httpx.ConnectError("sin red", request=request)
+
+def make_tool(tmp_path, monkeypatch, handler):
+    monkeypatch.setattr(search_tool, "WIKIPEDIA_CACHE_PATH", str(tmp_path / "wikipedia.sqlite"))
+    tool = WikipediaSearchTool(cache_ttl=60)
+    use_transport(tool, monkeypatch, handler)
+    return tool
+
+def use_transport(tool, monkeypatch, handler):
+    transport = httpx.MockTransport(handler)
+    tool._client = httpx.Client(transport=transport)
+    monkeypatch.setattr(search_tool.httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=transport))
+
+def wait_for_refresh(timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while search_tool._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(wikipedia_cache, "time", clock)
+    cache = WikipediaCache(str(tmp_path / "wikipedia.sqlite"), ttl=60)
+
+    cache.put("es", "page", "Mercurio", PAGE)
+    assert cache.get("es", "page", "Mercurio") == (PAGE, True)
+
+    clock.now += 61
+    assert cache.get("es", "page", "Mercurio") == (PAGE, False)
+    assert cache.get("es", "page", "Venus") == (None, False)
+
+def test_reads_touch_lru_order_at_most_once_per_interval(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(wikipedia_cache, "time", clock)
+    cache = WikipediaCache(str(tmp_path / "wikipedia.sqlite"), touch_interval=60)
+    cache.put("es", "page", "Mercurio", PAGE)
+    writes = cache._conn.total_changes
+
+    for _ in range(5):
+        clock.now += 1
+        cache.get("es", "page", "Mercurio")
+    assert cache._conn.total_changes == writes
+
+    clock.now += 60
+    cache.get("es", "page", "Mercurio")
+    assert cache._conn.total_changes == writes + 1
+
+def test_stale_entry_is_served_and_revalidated(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(wikipedia_cache, "time", clock)
+    tool = make_tool(tmp_path, monkeypatch, functools.partial(online, extract="Versión vieja."))
+    assert "Versión vieja." in asyncio.run(tool._arun("mercurio"))
+
+    clock.now += 61
+    use_transport(tool, monkeypatch, functools.partial(online, extract="Versión nueva."))
+
+    # La respuesta sale de la cache vencida; la nueva versión llega en segundo plano
+    assert "Versión vieja." in asyncio.run(tool._arun("mercurio"))
+    wait_for_refresh()
+    assert tool._cache.get("es", "page", "Mercurio (planeta)")[0]["summary"] == "Versión nueva."
+    assert "Versión nueva." in asyncio.run(tool._arun("mercurio"))
+
+def test_offline_serves_from_cache(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(wikipedia_cache, "time", clock)
+    tool = make_tool(tmp_path, monkeypatch, functools.partial(online, extract="Planeta más cercano al Sol."))
+    tool._run("mercurio")
+
+    clock.now += 61
+    use_transport(tool, monkeypatch, offline)
+
+    assert "Planeta más cercano al Sol." in tool._run("mercurio")
+    assert "Planeta más cercano al Sol." in asyncio.run(tool._arun("mercurio"))
+    wait_for_refresh()
+    assert tool._cache.get("es", "page", "Mercurio (planeta)")[1] is False
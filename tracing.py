@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache
+
+TRACES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "traces.jsonl")
+MAX_TRACES_BYTES = 5 * 1024 * 1024  # Al superarlo el archivo se rota a traces.jsonl.1
+RERUN_TRACE = "streamlit.rerun"  # Una ejecución del script de la interfaz, no una pregunta del usuario
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class Trace:
+    """Spans, eventos y tokens de una petición al asistente"""
+    
+    def __init__(self, name, **attributes):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.timestamp = time.time()
+        self.duration_ms = None
+        self.spans = []
+        self.events = []
+        self.tokens = {'prompt': 0, 'completion': 0}
+        self._lock = threading.Lock()
+    
+    def add_span(self, name, start, end, **attributes):
+        with self._lock:
+            self.spans.append({
+                'name': name,
+                'offset_ms': round((start - self.start) * 1000, 3),
+                'duration_ms': round((end - start) * 1000, 3),
+                **attributes
+            })
+    
+    def add_event(self, name, **attributes):
+        with self._lock:
+            self.events.append({'name': name, **attributes})
+    
+    def mark(self, name, **attributes):
+        """Evento con su instante relativo al inicio de la petición"""
+        self.add_event(name, offset_ms=round((time.perf_counter() - self.start) * 1000, 3), **attributes)
+    
+    def add_tokens(self, prompt=0, completion=0):
+        with self._lock:
+            self.tokens['prompt'] += prompt or 0
+            self.tokens['completion'] += completion or 0
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'timestamp': self.timestamp,
+            'duration_ms': self.duration_ms,
+            'attributes': self.attributes,
+            'tokens': self.tokens,
+            'spans': self.spans,
+            'events': self.events,
+        }
+
+def current_trace():
+    """Traza de la petición en curso, o None"""
+    return _current_trace.get()
+
+@contextmanager
+def trace_span(name, **attributes):
+    """Mide un bloque como span de la traza en curso (no hace nada si no hay traza)"""
+    trace = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add_span(name, start, time.perf_counter(), **attributes)
+
+def record_event(name, **attributes):
+    """Registra un evento (p. ej. acierto de cache) en la traza en curso"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_event(name, **attributes)
+
+@lru_cache(maxsize=1)
+def _callback_handler_class():
+    """Clase del callback de LangChain; se define al primer uso para no importar langchain_core al cargar el módulo"""
+    from langchain_core.callbacks import BaseCallbackHandler
+    
+    class TracingCallbackHandler(BaseCallbackHandler):
+        """Registra en la traza las llamadas al LLM (tiempo y tokens) y a las herramientas"""
+        
+        def __init__(self, trace):
+            self.trace = trace
+            self._starts = {}
+        
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+        
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+        
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            
+            # En streaming el uso viene en el mensaje generado
+            if not usage and response.generations and response.generations[0]:
+                message = getattr(response.generations[0][0], "message", None)
+                metadata = getattr(message, "usage_metadata", None) or {}
+                prompt_tokens = metadata.get("input_tokens", 0)
+                completion_tokens = metadata.get("output_tokens", 0)
+            
+            self.trace.add_tokens(prompt_tokens, completion_tokens)
+            if start is not None:
+                self.trace.add_span(
+                    "llm", start, time.perf_counter(),
+                    prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+                )
+        
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            if start is not None:
+                self.trace.add_span("llm", start, time.perf_counter(), error=str(error))
+        
+        def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+            self._starts[run_id] = (time.perf_counter(), serialized.get("name", "tool"))
+        
+        def on_tool_end(self, output, *, run_id, **kwargs):
+            start, name = self._starts.pop(run_id, (None, None))
+            if start is not None:
+                self.trace.add_span(f"tool.{name}", start, time.perf_counter())
+        
+        def on_tool_error(self, error, *, run_id, **kwargs):
+            start, name = self._starts.pop(run_id, (None, None))
+            if start is not None:
+                self.trace.add_span(f"tool.{name}", start, time.perf_counter(), error=str(error))
+    
+    return TracingCallbackHandler
+
+class Tracer:
+    """Crea una traza por petición y la agrega como una línea JSON al archivo de trazas"""
+    
+    def __init__(self, path=TRACES_PATH, enabled=True, max_bytes=MAX_TRACES_BYTES):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def request(self, name, **attributes):
+        """Traza una petición completa; los spans internos se asocian vía contextvars"""
+        if not self.enabled:
+            yield None
+            return
+        
+        trace = Trace(name, **attributes)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.duration_ms = round((time.perf_counter() - trace.start) * 1000, 3)
+            self._write(trace)
+    
+    def callbacks(self, trace):
+        """Callbacks de LangChain para la traza (lista vacía si el tracing está apagado)"""
+        return [_callback_handler_class()(trace)] if trace is not None else []
+    
+    def _write(self, trace):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            line = json.dumps(trace.to_dict(), ensure_ascii=False)
+            with self._lock:
+                # Solo se conservan el archivo actual y el anterior
+                if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            print(f"Error writing trace: {e}")
+
+def _tail_lines(path, n, block_size=64 * 1024):
+    """Últimas n líneas del archivo, leyendo bloques desde el final"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        while position > 0 and data.count(b"\n") <= n:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            data = f.read(size) + data
+    
+    return data.decode('utf-8', errors='replace').splitlines()[-n:]
+
+def load_traces(path=TRACES_PATH, last_n=500):
+    """Últimas trazas guardadas (completando con el archivo rotado si hacen falta)"""
+    lines = []
+    for file in (path + ".1", path):
+        if os.path.exists(file):
+            lines = (lines + _tail_lines(file, last_n))[-last_n:]
+    
+    traces = []
+    for line in lines:
+        try:
+            traces.append(json.loads(line))
+        except ValueError:
+            continue  # Línea cortada por una escritura en curso
+    return traces
+
+def _duration_row(name, values):
+    """Fila de la tabla de rendimiento: cantidad y percentiles de duración"""
+    import numpy as np
+    
+    return {
+        'span': name,
+        'count': len(values),
+        'p50_ms': round(float(np.percentile(values, 50)), 1),
+        'p95_ms': round(float(np.percentile(values, 95)), 1),
+        'max_ms': round(float(np.max(values)), 1),
+    }
+
+def summarize_traces(traces):
+    """Percentiles por tipo de span y por petición, tokens y aciertos de cache"""
+    durations = {}
+    events = {}
+    reruns = [trace for trace in traces if trace['name'] == RERUN_TRACE]
+    traces = [trace for trace in traces if trace['name'] != RERUN_TRACE]
+    
+    for trace in traces:
+        durations.setdefault(f"request.{trace['name']}", []).append(trace['duration_ms'])
+        for span in trace['spans']:
+            durations.setdefault(span['name'], []).append(span['duration_ms'])
+        for event in trace['events']:
+            events[event['name']] = events.get(event['name'], 0) + 1
+    
+    spans = [_duration_row(name, values) for name, values in sorted(durations.items())]
+    
+    # Las reejecuciones de Streamlit van en su propia fila, sin contar como peticiones
+    if reruns:
+        spans.append(_duration_row(f"request.{RERUN_TRACE}", [trace['duration_ms'] for trace in reruns]))
+    
+    return {
+        'requests': len(traces),
+        'reruns': len(reruns),
+        'spans': spans,
+        'events': events,
+        'prompt_tokens': sum(trace['tokens']['prompt'] for trace in traces),
+        'completion_tokens': sum(trace['tokens']['completion'] for trace in traces),
+    }
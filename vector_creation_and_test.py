@@ -1,15 +1,33 @@
 import os
 import re
 import json
+import hashlib
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import numpy as np
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
+from embedding_pipeline import EMBEDDING_MODEL, BatchEmbedder, get_embeddings
+from index_factory import (
+    INDEX_TYPES, PRECISIONS, DEFAULT_PRECISION, create_index, needs_training, supports_removal, index_precision
+)
+from metadata_catalog import CATALOG_FIELDS, MetadataCatalog
+from bm25_index import BM25Index
+from compact_index import build_compact_index, compact_index_is_current, saved_compact_dim
 
 load_dotenv()
 
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+MANIFEST_FILE = "manifest.json"
+TRAINING_SIZE = 20_000  # Chunks con que se entrenan los índices IVF/PQ al construirlos en streaming
+
 def load_manual_metadata():
     """Carga metadata manual desde archivo JSON"""
     json_file = os.path.join(os.path.dirname(__file__), "manual_metadata.json")
@@ -160,13 +178,11 @@ def process_document(file_path, manual_metadata):
     # Verificar si hay metadata manual
     if basename in manual_metadata:
         metadata.update(manual_metadata[basename])
-        print(f"  Using manual metadata for {basename}")
     else:
         # Intentar extraer autor del contenido
         author = extract_author_from_content(documents[0].page_content)
         if author:
             metadata['autor'] = author
-            print(f"  Found author: {author}")
         else:
             metadata['autor'] = f"Autor no identificado - {basename}"
     
@@ -178,68 +194,354 @@ def process_document(file_path, manual_metadata):
     
     return documents, None
 
-def create_vector_store():
-    """Crea el vector store con todos los documentos procesados"""
-    directory = os.path.dirname(os.path.abspath(__file__))
-    pdf_dir = os.path.join(directory, "Apuntadores")
-    persist_dir = os.path.join(directory, "vector_store")
+def _ingest_file(file_path, manual_metadata):
+    """Procesa un PDF dentro de un worker y mide cuánto tardó"""
+    start = time.perf_counter()
     
-    # Cargar metadata manual
-    manual_metadata = load_manual_metadata()
+    try:
+        documents, error = process_document(file_path, manual_metadata)
+    except Exception as e:
+        documents, error = None, f"Error processing {os.path.basename(file_path)}: {str(e)}"
     
-    # Verificar si ya existe el vector store
-    if os.path.exists(persist_dir):
-        print("Loading existing vector store...")
-        embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        return FAISS.load_local(persist_dir, embeddings, allow_dangerous_deserialization=True)
+    return file_path, documents, error, time.perf_counter() - start
+
+def _ingest_results(file_paths, manual_metadata, workers=1):
+    """Resultados de _ingest_file en el orden de entrada, con a lo sumo 2·workers archivos en vuelo"""
+    if workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            yield _ingest_file(file_path, manual_metadata)
+        return
+    
+    print(f"Processing {len(file_paths)} PDF files with {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        
+        for file_path in file_paths:
+            pending.append(executor.submit(_ingest_file, file_path, manual_metadata))
+            
+            # Backpressure: no leer más PDFs hasta entregar el más antiguo
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        
+        while pending:
+            yield pending.popleft().result()
+
+def ingest_documents(file_paths, manual_metadata, workers=1):
+    """Generador: procesa los PDFs (en paralelo si workers > 1) y entrega las páginas de cada archivo en orden"""
+    failures = []
+    
+    for file_path, documents, error, elapsed in _ingest_results(file_paths, manual_metadata, workers):
+        basename = os.path.basename(file_path)
+        print(f"Processing: {basename} ({elapsed:.2f}s)")
+        
+        if error:
+            print(f"  Warning: {error}")
+            failures.append(basename)
+            continue
+        
+        # Mostrar resumen de metadata
+        metadata = documents[0].metadata
+        print(f"  - Semana: {metadata.get('semana', 'N/A')}")
+        print(f"  - Autor: {metadata.get('autor', 'N/A')}")
+        print(f"  - Fecha: {metadata.get('fecha', 'N/A')}")
+        
+        yield documents
+    
+    if failures:
+        print(f"Failed to process {len(failures)} files: {', '.join(failures)}")
+
+def file_sha256(file_path):
+    """Calcula el hash SHA-256 del contenido de un archivo"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def build_settings(index_type="flat", precision=DEFAULT_PRECISION):
+    """Configuración de chunking, embeddings e índice que invalida el índice si cambia"""
+    settings = {
+        'embedding_model': EMBEDDING_MODEL,
+        'chunk_size': CHUNK_SIZE,
+        'chunk_overlap': CHUNK_OVERLAP,
+        'index_type': index_type,
+    }
     
-    print("Creating new vector store...")
+    # float32 no se anota, así los índices creados antes de esta opción siguen siendo válidos
+    if precision != DEFAULT_PRECISION:
+        settings['precision'] = precision
     
-    # Procesar todos los PDFs
-    file_paths = [os.path.join(pdf_dir, fn) for fn in os.listdir(pdf_dir) if fn.endswith('.pdf')]
-    all_documents = []
+    return settings
+
+def load_manifest(persist_dir):
+    """Carga el manifiesto de hashes por archivo guardado junto al índice"""
+    manifest_file = os.path.join(persist_dir, MANIFEST_FILE)
     
-    print(f"Found {len(file_paths)} PDF files to process")
+    if not os.path.exists(manifest_file):
+        return None
     
-    for file_path in file_paths:
-        basename = os.path.basename(file_path)
-        print(f"Processing: {basename}")
-        
-        try:
-            documents, error = process_document(file_path, manual_metadata)
-            
-            if error:
-                print(f"  Warning: {error}")
-                continue
-            
-            all_documents.extend(documents)
-            
-            # Mostrar resumen de metadata
-            metadata = documents[0].metadata
-            print(f"  - Semana: {metadata.get('semana', 'N/A')}")
-            print(f"  - Autor: {metadata.get('autor', 'N/A')}")
-            print(f"  - Fecha: {metadata.get('fecha', 'N/A')}")
-            
-        except Exception as e:
-            print(f"  Error processing {basename}: {str(e)}")
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading manifest: {e}")
+        return None
+
+def save_manifest(persist_dir, manifest):
+    """Guarda el manifiesto de forma atómica junto al índice"""
+    manifest_file = os.path.join(persist_dir, MANIFEST_FILE)
+    tmp_file = manifest_file + '.tmp'
+    
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    
+    os.replace(tmp_file, manifest_file)
+
+def fill_missing_metadata(vector_store, indexed_files):
+    """Completa desde el docstore la metadata de las entradas del manifiesto que no la tienen"""
+    filled = 0
+    for entry in indexed_files.values():
+        if 'metadata' in entry or not entry.get('ids'):
             continue
+        doc = vector_store.docstore.search(entry['ids'][0])
+        if isinstance(doc, str):  # Id sin documento en el docstore
+            continue
+        entry['metadata'] = {field: doc.metadata.get(field) for field in CATALOG_FIELDS}
+        filled += 1
     
-    # Dividir documentos en chunks
+    return filled
+
+def save_catalog(persist_dir, indexed_files):
+    """Guarda el catálogo de metadata por archivo (consultas de semana/autor sin LLM)"""
+    catalog = MetadataCatalog([entry['metadata'] for entry in indexed_files.values() if 'metadata' in entry])
+    catalog.save(persist_dir)
+
+def split_documents(documents):
+    """Divide los documentos en chunks y asigna ids estables por archivo"""
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
         separators=["\n\n", "\n", ". ", " "]
     )
     
-    split_documents = text_splitter.split_documents(all_documents)
-    print(f"Total documents after splitting: {len(split_documents)}")
+    chunks = text_splitter.split_documents(documents)
+    
+    # Ids deterministas: nombre de archivo + posición del chunk dentro del archivo
+    counters = {}
+    ids = []
+    for chunk in chunks:
+        basename = chunk.metadata['filename']
+        position = counters.get(basename, 0)
+        counters[basename] = position + 1
+        ids.append(f"{basename}:{position}")
     
-    # Crear y guardar vector store
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-    vector_store = FAISS.from_documents(split_documents, embeddings)
+    return chunks, ids
+
+def iter_chunks(documents_by_file):
+    """Divide cada archivo en chunks a medida que llega; entrega (chunk, id)"""
+    for documents in documents_by_file:
+        chunks, ids = split_documents(documents)
+        yield from zip(chunks, ids)
+
+def iter_batches(items, batch_size):
+    """Agrupa un iterable en listas de a lo sumo batch_size elementos"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def embed_chunk_batches(embedder, batches):
+    """Embebe lotes de (chunk, id) en orden y entrega (lote, vectores) sin materializar el corpus"""
+    queued = deque()
+    
+    def texts():
+        for batch in batches:
+            queued.append(batch)
+            yield [chunk.page_content for chunk, _ in batch]
+    
+    # embed_batches devuelve los lotes en el mismo orden en que los pidió
+    for _, vectors in embedder.embed_batches(texts()):
+        yield queued.popleft(), vectors
+
+def new_vector_store(embeddings, index_type, buffered, precision=DEFAULT_PRECISION):
+    """Crea el vector store con el primer tramo de lotes embebidos (IVF/PQ e int8 se entrenan con ellos)"""
+    training_vectors = np.vstack([vectors for _, vectors in buffered])
+    index = create_index(
+        index_type, training_vectors.shape[1], training_vectors=training_vectors, precision=precision
+    )
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={}
+    )
+
+def create_vector_store(pdf_dir=None, persist_dir=None, rebuild=False, workers=1,
+                        batch_size=64, max_in_flight=4, index_type="flat", embeddings=None,
+                        training_size=TRAINING_SIZE, precision=DEFAULT_PRECISION, compact_dim=None):
+    """Crea o actualiza incrementalmente el vector store con los documentos procesados"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    pdf_dir = pdf_dir or os.path.join(directory, "Apuntadores")
+    persist_dir = persist_dir or os.path.join(directory, "vector_store")
+    
+    # Cargar metadata manual
+    manual_metadata = load_manual_metadata()
+    embeddings = embeddings or get_embeddings()
+    settings = build_settings(index_type, precision)
+    
+    # Hashes del contenido actual de los PDFs
+    file_paths = {
+        fn: os.path.join(pdf_dir, fn)
+        for fn in sorted(os.listdir(pdf_dir)) if fn.endswith('.pdf')
+    }
+    hashes = {fn: file_sha256(path) for fn, path in file_paths.items()}
+    
+    # Reutilizar el índice existente solo si el manifiesto es compatible
+    manifest = load_manifest(persist_dir)
+    index_file = os.path.join(persist_dir, "index.faiss")
+    vector_store = None
+    indexed_files = {}
+    
+    if rebuild:
+        print("Rebuild requested, ignoring existing vector store...")
+    elif not os.path.exists(index_file):
+        print("Vector store not found, creating a new one...")
+    elif manifest is None:
+        print("Vector store has no manifest, rebuilding from scratch...")
+    elif manifest.get('settings') != settings:
+        print("Chunking/embedding settings changed, rebuilding from scratch...")
+    else:
+        print("Loading existing vector store...")
+        vector_store = FAISS.load_local(persist_dir, embeddings, allow_dangerous_deserialization=True)
+        indexed_files = manifest.get('files', {})
+        
+        # El manifiesto dice qué precisión se pidió; el índice guardado debe coincidir
+        stored_precision = index_precision(vector_store.index)
+        if stored_precision != precision:
+            print(f"Stored index precision is {stored_precision}, expected {precision}, rebuilding from scratch...")
+            vector_store = None
+            indexed_files = {}
+    
+    added = [fn for fn in hashes if fn not in indexed_files]
+    changed = [fn for fn in hashes if fn in indexed_files and indexed_files[fn]['sha256'] != hashes[fn]]
+    removed = [fn for fn in indexed_files if fn not in hashes]
+    
+    print(f"Found {len(file_paths)} PDF files: "
+          f"{len(added)} new, {len(changed)} changed, {len(removed)} removed")
+    
+    # Una vez creado, el índice compacto se mantiene al día en cada actualización
+    compact_dim = compact_dim or saved_compact_dim(persist_dir)
+    
+    if vector_store is not None and not (added or changed or removed):
+        print("Vector store is up to date")
+        # Manifiestos anteriores al catálogo: se completa la metadata y se regenera catalog.json
+        if fill_missing_metadata(vector_store, indexed_files):
+            save_manifest(persist_dir, {'settings': settings, 'files': indexed_files})
+            save_catalog(persist_dir, indexed_files)
+        if compact_dim and (saved_compact_dim(persist_dir) != compact_dim or not compact_index_is_current(persist_dir)):
+            build_compact_index(vector_store, persist_dir, compact_dim)
+        return vector_store
+    
+    if vector_store is not None and (changed or removed) and not supports_removal(vector_store.index):
+        print(f"Index type '{index_type}' does not support deleting vectors, rebuilding from scratch...")
+        vector_store = None
+        indexed_files = {}
+        added, changed, removed = list(hashes), [], []
+    
+    # Eliminar vectores de archivos borrados o modificados
+    stale_ids = [doc_id for fn in changed + removed for doc_id in indexed_files.pop(fn)['ids']]
+    if stale_ids:
+        vector_store.delete(stale_ids)
+        print(f"Removed {len(stale_ids)} stale chunks")
+    
+    # Embeber en lotes concurrentes; los lotes terminados quedan en checkpoints
+    embedder = BatchEmbedder(
+        embeddings,
+        batch_size=batch_size,
+        max_in_flight=max_in_flight,
+        checkpoint_dir=os.path.join(persist_dir, "checkpoints")
+    )
+    
+    # Pipeline en streaming: PDFs -> chunks -> lotes embebidos -> índice. Cada etapa tiene una
+    # ventana acotada, así la memoria de trabajo no crece con el corpus (solo el índice y el docstore)
+    documents = ingest_documents([file_paths[fn] for fn in added + changed], manual_metadata, workers=workers)
+    embedded = embed_chunk_batches(embedder, iter_batches(iter_chunks(documents), batch_size))
+    
+    buffered = []
+    n_chunks = 0
+    
+    def add_batch(batch, vectors):
+        chunks = [chunk for chunk, _ in batch]
+        vector_store.add_embeddings(
+            [(chunk.page_content, vector) for chunk, vector in zip(chunks, vectors)],
+            metadatas=[chunk.metadata for chunk in chunks],
+            ids=[doc_id for _, doc_id in batch]
+        )
+        
+        for chunk, doc_id in batch:
+            basename = chunk.metadata['filename']
+            entry = indexed_files.setdefault(basename, {
+                'sha256': hashes[basename],
+                'metadata': {field: chunk.metadata.get(field) for field in CATALOG_FIELDS},
+                'ids': []
+            })
+            entry['ids'].append(doc_id)
+    
+    for batch, vectors in embedded:
+        n_chunks += len(batch)
+        
+        if vector_store is not None:
+            add_batch(batch, vectors)
+            continue
+        
+        # Sin índice previo: IVF/PQ e int8 esperan a tener training_size chunks para entrenarse
+        buffered.append((batch, vectors))
+        if needs_training(index_type, precision) and sum(len(b) for b, _ in buffered) < training_size:
+            continue
+        
+        vector_store = new_vector_store(embeddings, index_type, buffered, precision)
+        for batch, vectors in buffered:
+            add_batch(batch, vectors)
+        buffered = []
+    
+    # Corpus menor que training_size: se entrena con todo lo que hay
+    if buffered:
+        vector_store = new_vector_store(embeddings, index_type, buffered, precision)
+        for batch, vectors in buffered:
+            add_batch(batch, vectors)
+    
+    print(f"Total new chunks indexed: {n_chunks}")
+    
+    if vector_store is None:
+        print("No documents to index")
+        return None
+    
+    # Guardar índice y manifiesto juntos (con la metadata que falte en entradas antiguas)
+    fill_missing_metadata(vector_store, indexed_files)
     vector_store.save_local(persist_dir)
+    save_manifest(persist_dir, {'settings': settings, 'files': indexed_files})
+    
+    # Catálogo de metadata por archivo para consultas de semana/autor sin LLM
+    save_catalog(persist_dir, indexed_files)
     
-    print(f"Vector store created with {len(split_documents)} documents")
+    # Índice léxico BM25 sobre los mismos chunks (se reconstruye desde el docstore, sin red)
+    BM25Index.from_vector_store(vector_store).save(persist_dir)
+    
+    # Índice truncado + vectores completos para la búsqueda en dos etapas de rag_search
+    if compact_dim:
+        build_compact_index(vector_store, persist_dir, compact_dim)
+    embedder.clear_checkpoints()
+    
+    if hasattr(embeddings, 'cache'):
+        stats = embeddings.cache.stats()
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.1%})")
+    
+    print(f"Vector store saved with {vector_store.index.ntotal} chunks")
     return vector_store
 
 def search_documents(vector_store, query, k=5):
@@ -260,8 +562,28 @@ def search_documents(vector_store, query, k=5):
         print("-" * 40)
 
 if __name__ == "__main__":
-    # Crear vector store
-    vector_store = create_vector_store()
+    parser = argparse.ArgumentParser(description="Crea o actualiza el vector store de los apuntes")
+    parser.add_argument("--rebuild", action="store_true", help="Ignora el índice existente y lo reconstruye completo")
+    parser.add_argument("--workers", type=int, default=1, help="Número de procesos para leer los PDFs en paralelo")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="Tipo de índice FAISS")
+    parser.add_argument("--precision", choices=PRECISIONS, default=DEFAULT_PRECISION,
+                        help="Precisión de los vectores guardados (float16/int8 reducen memoria y disco)")
+    parser.add_argument("--compact-dim", type=int,
+                        help="Crea también un índice truncado a esta dimensión (p. ej. 256) para búsqueda en dos etapas")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks por petición de embeddings")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Peticiones de embeddings concurrentes")
+    args = parser.parse_args()
+    
+    # Crear o actualizar vector store
+    vector_store = create_vector_store(
+        rebuild=args.rebuild,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_in_flight=args.max_in_flight,
+        index_type=args.index_type,
+        precision=args.precision,
+        compact_dim=args.compact_dim
+    )
     
     # Probar búsquedas
     test_queries = [
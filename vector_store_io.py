@@ -0,0 +1,42 @@
+import os
+import pickle
+import faiss
+from langchain_community.vectorstores import FAISS
+
+DEFAULT_PERSIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vector_store")
+
+def vector_store_version(persist_dir, index_name="index"):
+    """Identificador de la versión guardada del vector store (cambia al reconstruirlo)"""
+    parts = []
+    for extension in ("faiss", "pkl"):
+        try:
+            stat = os.stat(os.path.join(persist_dir, f"{index_name}.{extension}"))
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            parts.append("missing")
+    return "/".join(parts)
+
+def mmap_flags():
+    """Flags de lectura mapeada en memoria y de solo lectura soportados por esta versión de FAISS"""
+    # IO_FLAG_MMAP_IFC mapea los códigos de índices planos (Flat, SQ, almacenamiento de HNSW)
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+def load_vector_store(persist_dir, embeddings, mmap=False, index_name="index"):
+    """Carga el vector store; con mmap=True el índice se abre mapeado y de solo lectura"""
+    if not mmap:
+        return FAISS.load_local(
+            persist_dir, embeddings, index_name=index_name, allow_dangerous_deserialization=True
+        )
+    
+    # Varios procesos comparten la misma copia del índice en la page cache
+    index = faiss.read_index(os.path.join(persist_dir, f"{index_name}.faiss"), mmap_flags())
+    
+    with open(os.path.join(persist_dir, f"{index_name}.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id
+    )
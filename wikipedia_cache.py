@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+class WikipediaCache:
+    """Cache persistente en SQLite para búsquedas y resúmenes de Wikipedia, con TTL y expulsión LRU"""
+    
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=5000, touch_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # El orden LRU solo se actualiza si el último acceso es más viejo que esto: evita escribir en cada lectura
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT, fetched_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+        self._conn.commit()
+    
+    @staticmethod
+    def make_key(language, kind, key):
+        """Clave por idioma, tipo de dato (search/page) y título o consulta"""
+        return f"{language}:{kind}:{' '.join(key.split()).lower()}"
+    
+    def get(self, language, kind, key):
+        """Devuelve (valor, está_fresco); (None, False) si no está en la cache"""
+        cache_key = self.make_key(language, kind, key)
+        
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, fetched_at, last_access FROM entries WHERE key = ?", (cache_key,)
+            ).fetchone()
+            
+            if row is None:
+                self.misses += 1
+                return None, False
+            
+            now = time.time()
+            if now - row[2] > self.touch_interval:
+                self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, cache_key))
+                self._conn.commit()
+            
+            fresh = now - row[1] <= self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        
+        return json.loads(row[0]), fresh
+    
+    def put(self, language, kind, key, value):
+        """Guarda un valor y expulsa las entradas menos usadas si se excede el límite"""
+        now = time.time()
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, fetched_at, last_access) VALUES (?, ?, ?, ?)",
+                (self.make_key(language, kind, key), json.dumps(value, ensure_ascii=False), now, now)
+            )
+            
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            
+            self._conn.commit()
+    
+    def stats(self):
+        """Estadísticas de uso de la cache en este proceso"""
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.stale_hits) / total if total else 0.0
+        }